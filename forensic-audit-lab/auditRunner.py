@@ -0,0 +1,525 @@
+import os
+import re
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from auditorStage import TOKEN_BUDGET, run_auditor_stage
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'port': os.environ.get('DB_PORT', '5432'),
+    'database': os.environ.get('DB_NAME', 'auditoria'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', '')
+}
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql')
+SHARED_SQL_DIR = os.path.join(SQL_DIR, 'shared')
+INCREMENTAL_SQL_DIR = os.path.join(SQL_DIR, 'incremental')
+POOL_SIZE = 5
+FETCH_SIZE = 2000
+
+
+# =============================================================================
+# DETECTORS
+# =============================================================================
+# Same five queries and report layout as the n8n workflow
+# (Forensic Audit Pipeline.json): each detector streams its rows, keeps the
+# ones the "Format Audit Report1" node keeps, and renders its own section.
+#
+# For incremental runs each detector also declares which entity a finding is
+# about: 'key' builds it from a result row, 'touched' is the same key as a SQL
+# expression over audit_delta, and 'order' restores the query's ORDER BY when
+# the report is rebuilt from stored findings. 'seed_from_delta' detectors use
+# their sql/incremental query on the seed run too, so the seed classifies rows
+# exactly as later runs will.
+
+def format_split(i, d):
+    return (f"Case {i}: {d['employee_id']} → {d['vendor_id']} on {d['date']}\n"
+            f"  Fragments: {d['fragments']}, Real Total: ${d['real_total']}, "
+            f"Max Single: ${d['max_single']}, Risk: {d['risk_level']}\n\n")
+
+
+def format_duplicate(i, d):
+    return (f"Case {i}: Invoice {d['invoice_number']} submitted {d['times_submitted']}x by {d['employees_involved']}\n"
+            f"  Amounts: ${d['min_amount']} / ${d['max_amount']} ({d['pct_difference']}% diff), "
+            f"{d['days_apart']} days apart, Type: {d['duplicate_type']}\n\n")
+
+
+def format_ghost(i, d):
+    return (f"Case {i}: {d['vendor_id']} → only employee: {d['employees']}\n"
+            f"  Transactions: {d['total_transactions']}, Avg Amount: ${d['avg_amount']}, "
+            f"Total Billed: ${d['total_amount']}\n\n")
+
+
+def format_inflated(i, d):
+    return (f"Case {i}: {d['employee_id']} ({d['category']})\n"
+            f"  Avg Amount: ${d['emp_avg']}, Top Quartile: {d['pct_top_quartile']}%, "
+            f"Top Decile: {d['pct_top_decile']}%, Risk: {d['risk_level']}\n\n")
+
+
+def format_round(i, d):
+    return (f"Case {i}: {d['employee_id']}\n"
+            f"  Round Count: {d['round_count']}/{d['total_transactions']} ({d['round_pct']}%), "
+            f"Amounts: {d['round_amounts_used']}, Risk: {d['risk_level']}\n\n")
+
+
+DETECTORS = [
+    {
+        'name': 'split_purchase',
+        'sql': 'splitPurchaseDetection.sql',
+        'title': 'SPLIT PURCHASE DETECTION',
+        'unit': 'events',
+        'summary': 'Split purchase events',
+        'keep': lambda d: True,
+        'format': format_split,
+        'employees': lambda d: [d['employee_id']],
+        'key': lambda d: f"{d['employee_id']}|{d['vendor_id']}|{d['date']}",
+        'touched': "employee_id || '|' || vendor_id || '|' || date::TEXT",
+        'order': lambda d: -float(d['real_total']),
+    },
+    {
+        'name': 'duplicate_invoice',
+        'sql': 'duplicateInvoiceDetection.sql',
+        'title': 'DUPLICATE INVOICE DETECTION',
+        'unit': 'duplicate invoices',
+        'summary': 'Duplicate invoices',
+        'keep': lambda d: True,
+        'format': format_duplicate,
+        'employees': lambda d: d['employees_involved'].split(', '),
+        'key': lambda d: d['invoice_number'],
+        'touched': 'invoice_number',
+        'order': lambda d: (d['pct_difference'] is None, float(d['pct_difference'] or 0)),
+    },
+    {
+        'name': 'ghost_vendor',
+        'sql': 'ghostVendorDetection.sql',
+        'title': 'GHOST VENDOR DETECTION',
+        'unit': 'vendors with single-employee relationship',
+        'summary': 'Ghost vendors',
+        'keep': lambda d: d['risk_level'] == 'CRITICAL',
+        'format': format_ghost,
+        'employees': lambda d: d['employees'].split(', '),
+        'key': lambda d: d['vendor_id'],
+        'touched': 'vendor_id',
+        'order': lambda d: (d['unique_employees'], -float(d['total_amount'])),
+    },
+    {
+        'name': 'inflated_amount',
+        'sql': 'inflatedAmountDetection.sql',
+        'title': 'INFLATED AMOUNT DETECTION',
+        'unit': 'employees with above-normal spending patterns',
+        'summary': 'Inflated amount suspects',
+        'keep': lambda d: d['risk_level'] != 'LOW',
+        'format': format_inflated,
+        'employees': lambda d: [d['employee_id']],
+        'key': lambda d: d['employee_id'],
+        'touched': 'employee_id',
+        'order': lambda d: -float(d['pct_top_quartile']),
+        'seed_from_delta': True,
+    },
+    {
+        'name': 'round_number',
+        'sql': 'roundNumberDetection.sql',
+        'title': 'ROUND NUMBER DETECTION',
+        'unit': 'employees with suspicious round number patterns',
+        'summary': 'Round number suspects',
+        'keep': lambda d: d['risk_level'] in ('CRITICAL', 'HIGH'),
+        'format': format_round,
+        'employees': lambda d: [d['employee_id']],
+        'key': lambda d: d['employee_id'],
+        'touched': 'employee_id',
+        'order': lambda d: -float(d['round_pct']),
+    },
+]
+
+
+def load_query(filename, sql_dir=SQL_DIR):
+    with open(os.path.join(sql_dir, filename)) as f:
+        return f.read().strip().rstrip(';')
+
+
+def summarize_rows(detector, rows):
+    """Keep, format and collect one detector's rows into its report section."""
+    cases, kept, employees, risk_levels = [], [], set(), set()
+    for row in rows:
+        if not detector['keep'](row):
+            continue
+        cases.append(detector['format'](len(cases) + 1, row))
+        kept.append(row)
+        employees.update(detector['employees'](row))
+        risk_levels.add(row.get('risk_level'))
+
+    section = (f"--- {detector['title']} ---\nFindings: {len(cases)} {detector['unit']}\n\n"
+               + ''.join(cases))
+    return {
+        'name': detector['name'],
+        'summary': detector['summary'],
+        'section': section,
+        'rows': kept,
+        'findings': len(cases),
+        'employees': employees,
+        'risk_levels': risk_levels,
+    }
+
+
+def run_detector(pool, detector, sql_dir=SQL_DIR):
+    """Execute one detection query on a pooled connection, streaming rows through a server-side cursor."""
+    query = load_query(detector['sql'], sql_dir)
+    start = time.perf_counter()
+
+    conn = pool.getconn()
+    try:
+        # Named cursors are server-side: rows arrive in FETCH_SIZE batches instead of all at once
+        with conn.cursor(name=f"audit_{detector['name']}", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = FETCH_SIZE
+            cursor.execute(query)
+            result = summarize_rows(detector, cursor)
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def build_rollups(pool, sql_dir=SHARED_SQL_DIR):
+    """Materialize the shared intermediate tables the sql/shared detectors read."""
+    start = time.perf_counter()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(load_query('auditRollups.sql', sql_dir))
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+    return time.perf_counter() - start
+
+
+# =============================================================================
+# INCREMENTAL STATE
+# =============================================================================
+# audit_watermark stores the last transaction_id already audited. An
+# incremental run copies the rows above it into audit_delta, re-runs the
+# sql/incremental detectors restricted to the employees, vendors, invoice
+# numbers and (employee, vendor, date) groups those rows touch, and replaces
+# exactly those keys in audit_findings. The report is then rebuilt from the
+# merged findings, so a daily run costs time proportional to the day's volume.
+# The first run (no watermark yet) evaluates the full queries once to seed
+# the state.
+#
+# Inflated amounts need category percentiles, which a key filter cannot
+# restrict. Instead the seed stores each category's 75th / 90th percentile in
+# audit_category_quantiles and per-employee counts above them in
+# audit_employee_amounts; later runs rank only the delta rows against those
+# cut points and fold them into the counts. The seed itself runs the same
+# query against empty counts and cut points computed from every row, so a
+# transaction is classified identically whichever run first sees it. The cut
+# points stay fixed until the next seed (clear audit_watermark to reseed).
+
+def read_watermark(pool):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(load_query('auditState.sql', INCREMENTAL_SQL_DIR))
+            cursor.execute("SELECT last_transaction_id, last_date FROM audit_watermark WHERE id = 1")
+            row = cursor.fetchone()
+            # State written before the amount tables existed has to be reseeded
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM audit_category_quantiles)")
+            if not cursor.fetchone()[0]:
+                row = None
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+    return row
+
+
+def build_delta(pool, watermark, full=False):
+    """Copy transactions above the watermark into audit_delta; returns the row count."""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(load_query('auditDelta.sql', INCREMENTAL_SQL_DIR), {'watermark': watermark})
+            cursor.execute("SELECT COUNT(*) FROM audit_delta")
+            count = cursor.fetchone()[0]
+            # Cut points for new categories; a seed recomputes all of them from empty counts
+            if full:
+                cursor.execute("DELETE FROM audit_category_quantiles")
+                cursor.execute("DELETE FROM audit_employee_amounts")
+            cursor.execute(load_query('categoryQuantiles.sql', INCREMENTAL_SQL_DIR))
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+    return count
+
+
+def fetch_detector_rows(pool, detector, sql_dir):
+    """All rows of one detector (unfiltered by 'keep'), for storing as findings."""
+    start = time.perf_counter()
+    conn = pool.getconn()
+    try:
+        with conn.cursor(name=f"audit_{detector['name']}", cursor_factory=RealDictCursor) as cursor:
+            cursor.itersize = FETCH_SIZE
+            cursor.execute(load_query(detector['sql'], sql_dir))
+            rows = list(cursor)
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+    return rows, time.perf_counter() - start
+
+
+def merge_findings(cursor, detector, rows, full=False):
+    """Replace the stored findings of every re-evaluated key with the fresh rows."""
+    if full:
+        cursor.execute("DELETE FROM audit_findings WHERE detector = %s", (detector['name'],))
+    else:
+        # Keys touched by the new rows that no longer qualify drop out here
+        cursor.execute(
+            f"DELETE FROM audit_findings WHERE detector = %s "
+            f"AND finding_key IN (SELECT DISTINCT {detector['touched']} FROM audit_delta)",
+            (detector['name'],),
+        )
+    execute_values(cursor, """
+        INSERT INTO audit_findings (detector, finding_key, finding) VALUES %s
+        ON CONFLICT (detector, finding_key)
+        DO UPDATE SET finding = EXCLUDED.finding, updated_at = CURRENT_TIMESTAMP
+    """, [(detector['name'], detector['key'](row), json.dumps(row, default=str)) for row in rows])
+
+
+def update_amount_state(cursor):
+    """Add the delta rows to the per-employee counts the inflated-amount detector reads."""
+    cursor.execute(load_query('employeeAmounts.sql', INCREMENTAL_SQL_DIR))
+
+
+def advance_watermark(cursor):
+    cursor.execute("""
+        INSERT INTO audit_watermark (id, last_transaction_id, last_date)
+        SELECT 1, MAX(transaction_id), MAX(date) FROM audit_delta HAVING COUNT(*) > 0
+        ON CONFLICT (id) DO UPDATE SET
+            last_transaction_id = EXCLUDED.last_transaction_id,
+            last_date = EXCLUDED.last_date,
+            updated_at = CURRENT_TIMESTAMP
+    """)
+
+
+def load_findings(pool):
+    """Rebuild every detector's result from the merged audit_findings state."""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT detector, finding FROM audit_findings")
+            stored = cursor.fetchall()
+        conn.commit()
+    finally:
+        pool.putconn(conn)
+
+    by_detector = {d['name']: [] for d in DETECTORS}
+    for name, finding in stored:
+        by_detector[name].append(finding)
+    return [summarize_rows(d, sorted(by_detector[d['name']], key=d['order'])) for d in DETECTORS]
+
+
+def run_incremental(pool, pool_size, timings):
+    """Re-evaluate the keys touched since the watermark and merge them into audit_findings."""
+    watermark = read_watermark(pool)
+    full = watermark is None
+    last_id = 0 if full else watermark[0]
+
+    stage = time.perf_counter()
+    new_rows = build_delta(pool, last_id, full)
+    timings['delta'] = round(time.perf_counter() - stage, 3)
+    print(f"[*] Watermark: {'none (seeding full state)' if full else f'transaction {last_id} ({watermark[1]})'}, "
+          f"{new_rows} new transactions")
+
+    if new_rows:
+        sql_dir = SQL_DIR if full else INCREMENTAL_SQL_DIR
+        with ThreadPoolExecutor(max_workers=pool_size) as executor:
+            futures = [executor.submit(fetch_detector_rows, pool, d,
+                                       INCREMENTAL_SQL_DIR if d.get('seed_from_delta') else sql_dir)
+                       for d in DETECTORS]
+            fetched = [f.result() for f in futures]
+
+        # Findings and watermark move together: a failed run leaves the previous state intact
+        stage = time.perf_counter()
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                for detector, (rows, seconds) in zip(DETECTORS, fetched):
+                    merge_findings(cursor, detector, rows, full)
+                    timings[detector['name']] = round(seconds, 3)
+                update_amount_state(cursor)
+                advance_watermark(cursor)
+            conn.commit()
+        finally:
+            pool.putconn(conn)
+        timings['merge'] = round(time.perf_counter() - stage, 3)
+
+    return load_findings(pool)
+
+
+# =============================================================================
+# REPORT
+# =============================================================================
+
+def assemble_report(results):
+    report = '=== FORENSIC AUDIT REPORT ===\n\n'
+    report += ''.join(r['section'] for r in results)
+
+    all_employees = set().union(*(r['employees'] for r in results))
+    report += '--- SUMMARY ---\n'
+    report += f"Total unique employees flagged: {len(all_employees)}\n"
+    for r in results:
+        report += f"{r['summary']}: {r['findings']}\n"
+    return report
+
+
+def overall_severity(results):
+    levels = set().union(*(r['risk_levels'] for r in results if r['findings']))
+    for level in ('CRITICAL', 'HIGH', 'MEDIUM'):
+        if level in levels:
+            return level
+    return 'LOW'
+
+
+def save_report(conn, report, results, analysis=None, timings=None, severity=None):
+    """Persist the run to audit_reports (same table the n8n workflow writes)."""
+    text = analysis or report
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS audit_reports (
+              id SERIAL PRIMARY KEY,
+              ai_analysis TEXT,
+              flagged_employees TEXT,
+              flagged_vendors TEXT,
+              overall_severity VARCHAR(20),
+              created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("ALTER TABLE audit_reports ADD COLUMN IF NOT EXISTS audit_report TEXT")
+        cursor.execute("ALTER TABLE audit_reports ADD COLUMN IF NOT EXISTS stage_timings JSONB")
+        cursor.execute("""
+            INSERT INTO audit_reports
+                (ai_analysis, flagged_employees, flagged_vendors, overall_severity, audit_report, stage_timings)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING id
+        """, (
+            analysis,
+            json.dumps(sorted(set(re.findall(r'EMP-\d+', text)))),
+            json.dumps(sorted(set(re.findall(r'PROV-\d+', text)))),
+            severity or overall_severity(results),
+            report,
+            json.dumps(timings or {}),
+        ))
+        report_id = cursor.fetchone()[0]
+    conn.commit()
+    return report_id
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def run_audit(sql_dir=SQL_DIR, pool_size=POOL_SIZE, save=True, shared_rollups=False,
+              ai=False, token_budget=TOKEN_BUDGET, incremental=False):
+    if shared_rollups and incremental:
+        raise ValueError('shared rollups and incremental runs cannot be combined')
+
+    timings = {}
+    start = time.perf_counter()
+    pool = ThreadedConnectionPool(1, pool_size, **DB_CONFIG)
+    try:
+        # Shared mode scans transactions once into rollup tables, then every
+        # detector reads the (much smaller) rollups instead of the base table
+        if shared_rollups:
+            sql_dir = SHARED_SQL_DIR
+            timings['rollups'] = round(build_rollups(pool, sql_dir), 3)
+
+        if incremental:
+            results = run_incremental(pool, pool_size, timings)
+        else:
+            # All five detections run concurrently; total time is close to the slowest query
+            with ThreadPoolExecutor(max_workers=pool_size) as executor:
+                futures = [executor.submit(run_detector, pool, d, sql_dir) for d in DETECTORS]
+                results = [f.result() for f in futures]
+            for r in results:
+                timings[r['name']] = round(r['seconds'], 3)
+        timings['detections'] = round(time.perf_counter() - start, 3)
+
+        stage = time.perf_counter()
+        report = assemble_report(results)
+        timings['report'] = round(time.perf_counter() - stage, 3)
+
+        # Only the compacted findings reach the model; unchanged findings reuse the cached answer
+        parsed = None
+        if ai:
+            parsed, ai_timings = run_auditor_stage(results, token_budget)
+            timings.update(ai_timings)
+            print(f"[*] AI auditor: ~{parsed['prompt_tokens']} prompt tokens, "
+                  f"{'cached response' if parsed['cache_hit'] else 'model called'}")
+
+        report_id = None
+        if save:
+            stage = time.perf_counter()
+            conn = pool.getconn()
+            try:
+                report_id = save_report(
+                    conn, report, results,
+                    analysis=parsed and parsed['ai_analysis'],
+                    severity=parsed and parsed['overall_severity'],
+                    timings=timings,
+                )
+            finally:
+                pool.putconn(conn)
+            timings['save'] = round(time.perf_counter() - stage, 3)
+    finally:
+        pool.closeall()
+
+    timings['total'] = round(time.perf_counter() - start, 3)
+    return report, results, timings, report_id, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the five forensic detections without n8n.')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE)
+    parser.add_argument('--no-save', action='store_true', help='Print the report without writing audit_reports')
+    parser.add_argument('--shared-rollups', action='store_true',
+                        help='Build the shared rollup tables once and run the sql/shared detectors on them')
+    parser.add_argument('--ai', action='store_true',
+                        help='Send compacted findings to the AI auditor (Ollama at OLLAMA_URL)')
+    parser.add_argument('--token-budget', type=int, default=TOKEN_BUDGET)
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only re-evaluate keys touched by transactions above the stored watermark')
+    args = parser.parse_args()
+    # The rollups cover the whole table; incremental runs read audit_delta instead
+    if args.shared_rollups and args.incremental:
+        parser.error('--shared-rollups cannot be combined with --incremental')
+
+    print("=" * 70)
+    print("  FORENSIC AUDIT — DETECTION RUN")
+    print("=" * 70)
+
+    report, results, timings, report_id, parsed = run_audit(
+        pool_size=args.pool_size, save=not args.no_save, shared_rollups=args.shared_rollups,
+        ai=args.ai, token_budget=args.token_budget, incremental=args.incremental,
+    )
+    print(report)
+    if parsed:
+        print(f"--- AI ANALYSIS ({parsed['overall_severity']}) ---\n{parsed['ai_analysis']}\n")
+
+    print(f"{'=' * 70}")
+    print("  STAGE TIMINGS")
+    print(f"{'=' * 70}")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<20} {seconds:>8.3f}s")
+    if report_id is not None:
+        print(f"\n[+] Saved audit report #{report_id} to audit_reports")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+# =============================================================================
+# DIGIT DISTRIBUTION ACCUMULATOR
+# =============================================================================
+# The round number detector only checks MOD(amount, 500) = 0. Digit tests
+# generalize it: first digit and first two digits against Benford's law, last
+# digit (of the amount in cents) against a uniform distribution.
+#
+# DigitHistogram keeps one count table per entity type (entities x digits), so
+# it can be fed chunk by chunk and merged across shards by plain addition.
+
+DIGIT_TESTS = {
+    'first':     np.arange(1, 10),
+    'first_two': np.arange(10, 100),
+    'last':      np.arange(0, 10),
+}
+
+EXPECTED = {
+    'first':     np.log10(1 + 1 / DIGIT_TESTS['first']),
+    'first_two': np.log10(1 + 1 / DIGIT_TESTS['first_two']),
+    'last':      np.full(10, 0.1),
+}
+
+# Nigrini's MAD cut-offs: close / acceptable / marginal conformity
+MAD_THRESHOLDS = {
+    'first':     (0.006, 0.012, 0.015),
+    'first_two': (0.0012, 0.0018, 0.0022),
+    'last':      (0.004, 0.008, 0.012),
+}
+
+ENTITY_KEYS = ['employee_id', 'vendor_id']
+
+
+def extract_digits(amounts):
+    """First, first-two and last digits of each amount (in cents), vectorized."""
+    cents = np.round(np.abs(np.asarray(amounts, dtype='float64')) * 100).astype('int64')
+    cents = np.where(cents > 0, cents, 1)
+    magnitude = np.floor(np.log10(cents)).astype('int64')
+    first_two = np.where(magnitude >= 1, cents // 10 ** np.maximum(magnitude - 1, 0), -1)
+    return {
+        'first': cents // 10 ** magnitude,
+        'first_two': first_two,
+        'last': cents % 10,
+    }
+
+
+class DigitHistogram:
+
+    def __init__(self, keys=ENTITY_KEYS):
+        self.keys = list(keys)
+        self.counts = {
+            (key, test): pd.DataFrame(columns=DIGIT_TESTS[test], dtype='int64')
+            for key in self.keys + ['ledger'] for test in DIGIT_TESTS
+        }
+
+    def update(self, df):
+        """Add one chunk of transactions to every entity's digit counts."""
+        digits = extract_digits(df['amount'])
+        for test, values in digits.items():
+            valid = values >= 0
+            frame = pd.DataFrame({'digit': values[valid]})
+            for key in self.keys + ['ledger']:
+                frame['entity'] = 'ALL' if key == 'ledger' else df[key].to_numpy()[valid]
+                chunk = (frame.groupby(['entity', 'digit']).size()
+                         .unstack(fill_value=0)
+                         .reindex(columns=DIGIT_TESTS[test], fill_value=0))
+                self._add(key, test, chunk)
+        return self
+
+    def merge(self, other):
+        """Fold another histogram (another chunk or shard) into this one."""
+        for (key, test), counts in other.counts.items():
+            self._add(key, test, counts)
+        return self
+
+    def _add(self, key, test, counts):
+        current = self.counts[(key, test)]
+        self.counts[(key, test)] = current.add(counts, fill_value=0).astype('int64')
+
+    def conformity(self, key='employee_id', test='first', min_count=50, alpha=0.01):
+        """Chi-square and MAD per entity against the expected digit distribution.
+
+        MAD cut-offs assume large samples, so an entity is only called
+        NONCONFORMITY when the chi-square test also rejects at alpha.
+        """
+        counts = self.counts[(key, test)]
+        observed = counts.to_numpy(dtype='float64')
+        n = observed.sum(axis=1)
+        expected = EXPECTED[test] / EXPECTED[test].sum()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            proportions = observed / n[:, None]
+            expected_counts = n[:, None] * expected
+            chi2 = ((observed - expected_counts) ** 2 / expected_counts).sum(axis=1)
+        mad = np.abs(proportions - expected).mean(axis=1)
+        p_value = stats.chi2.sf(chi2, df=len(expected) - 1)
+
+        close, acceptable, marginal = MAD_THRESHOLDS[test]
+        verdict = np.select(
+            [n < min_count, mad <= close, mad <= acceptable, (mad <= marginal) | (p_value >= alpha)],
+            ['INSUFFICIENT DATA', 'CLOSE', 'ACCEPTABLE', 'MARGINAL'],
+            default='NONCONFORMITY',
+        )
+
+        return pd.DataFrame({
+            'transactions': n.astype('int64'),
+            'chi2': chi2,
+            'p_value': p_value,
+            'mad': mad,
+            'conformity': verdict,
+        }, index=counts.index.rename(key)).sort_values('mad', ascending=False)
+
+
+def scan_csv(path, chunksize=500_000, keys=ENTITY_KEYS):
+    """Stream a transactions CSV once, accumulating digit counts chunk by chunk."""
+    histogram = DigitHistogram(keys)
+    for chunk in pd.read_csv(path, usecols=['amount'] + list(keys), chunksize=chunksize):
+        histogram.update(chunk)
+    return histogram
+
+
+def scan_arrow(path, keys=ENTITY_KEYS):
+    """Same scan over a memory-mapped Arrow IPC file, one record batch at a time."""
+    import pyarrow as pa
+
+    histogram = DigitHistogram(keys)
+    with pa.memory_map(path) as source:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            batch = pa.Table.from_batches([reader.get_batch(i)])
+            chunk = batch.select(['amount_cents'] + list(keys)).to_pandas()
+            chunk['amount'] = chunk.pop('amount_cents') / 100
+            histogram.update(chunk)
+    return histogram
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Digit distribution (Benford) tests per entity.')
+    parser.add_argument('path', nargs='?', default='output/transactions.csv',
+                        help='Transactions CSV, or the Arrow IPC file (.arrow) written by forensicAuditScript')
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--min-count', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.path.endswith('.arrow'):
+        histogram = scan_arrow(args.path)
+    else:
+        histogram = scan_csv(args.path, args.chunksize)
+
+    print("=" * 70)
+    print("  DIGIT DISTRIBUTION TESTS")
+    print("=" * 70)
+    ledger = pd.concat({test: histogram.conformity('ledger', test) for test in DIGIT_TESTS})
+    print(ledger.droplevel(1).round(4).to_string())
+
+    for key in ENTITY_KEYS:
+        for test in DIGIT_TESTS:
+            result = histogram.conformity(key, test, args.min_count)
+            flagged = result[result['conformity'] == 'NONCONFORMITY']
+            print(f"\n  {key} / {test} digit: {len(flagged)} nonconforming")
+            if len(flagged):
+                print(flagged.head(10).round(4).to_string())
+
+
+if __name__ == "__main__":
+    main()
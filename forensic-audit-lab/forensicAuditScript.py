@@ -4,10 +4,14 @@ from scipy import stats
 from datetime import datetime, timedelta
 import random
 import os
+import json
 import hashlib
 
-random.seed(3003)
-np.random.seed(3003)
+from stageCache import StageCache
+
+SEED = 3003
+random.seed(SEED)
+np.random.seed(SEED)
 
 DB_CONFIG = {
     'host': os.environ.get('DB_HOST', 'localhost'),
@@ -23,6 +27,21 @@ NUM_VENDORS = 70
 APPROVAL_THRESHOLD = 5000
 FRAUD_RATIO = 0.05
 
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+SCHEMA_COLUMNS = ['transaction_id', 'date', 'employee_id', 'vendor_id',
+                  'amount', 'category', 'invoice_number']
+COPY_CHUNK_ROWS = 50000
+
+COLUMNAR_DIR = 'output/columnar'
+ARROW_PATH = 'output/transactions.arrow'
+DICTIONARY_COLUMNS = ['employee_id', 'vendor_id', 'category', 'fraud_type']
+FEATURE_COLUMN_TYPES = {
+    'z_score': 'float32',
+    'pair_frequency': 'int32',
+    'employee_total_spend': 'float64',
+    'cat_percentile': 'float32',
+}
+
 
 CATEGORIES = {
     'IT':        {'mean': 1800, 'std': 900,  'min': 50,  'max': 4800},
@@ -331,67 +350,110 @@ def add_statistical_features(df):
 
     return df
 
-def create_visualizations(df):
-    """Generate analysis charts."""
+def box_stats(values, groups):
+    """Per-group boxplot statistics (quartiles + 1.5 IQR whiskers) for Axes.bxp."""
+    grouped = values.groupby(groups, observed=True)
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    iqr = quartiles[0.75] - quartiles[0.25]
+    lower_fence = (quartiles[0.25] - 1.5 * iqr).reindex(groups).to_numpy()
+    upper_fence = (quartiles[0.75] + 1.5 * iqr).reindex(groups).to_numpy()
+    inside = values.where((values >= lower_fence) & (values <= upper_fence))
+    whiskers = inside.groupby(groups, observed=True).agg(['min', 'max'])
+
+    return [
+        {'label': str(group), 'q1': row[0.25], 'med': row[0.5], 'q3': row[0.75],
+         'whislo': whiskers.loc[group, 'min'], 'whishi': whiskers.loc[group, 'max'], 'fliers': []}
+        for group, row in quartiles.iterrows()
+    ]
+
+
+def compute_chart_aggregates(df):
+    """Reduce the transactions to the per-group numbers the charts need (no frame copies)."""
+    fraud_label = df['is_fraud'].map({True: 'Fraudulent', False: 'Legitimate'})
+    month = pd.to_datetime(df['date']).dt.month.rename('month')
+
+    monthly = df.groupby([month, df['is_fraud'].map({True: 'Fraud', False: 'Legit'}).rename('label')]).size()
+
+    pair_counts = df.groupby(['employee_id', 'vendor_id']).size()
+    top_pairs = pair_counts.nlargest(20)
+    ghost_pairs = df.loc[df['fraud_type'] == 'ghost_vendor', ['employee_id', 'vendor_id']]
+    top_is_ghost = top_pairs.index.isin(pd.MultiIndex.from_frame(ghost_pairs))
+
+    fraud_summary = df[df['is_fraud']].groupby('fraud_type').agg(
+        avg_amount=('amount', 'mean'),
+        std_amount=('amount', 'std'),
+        avg_zscore=('z_score', 'mean'),
+        avg_pair_freq=('pair_frequency', 'mean'),
+        total_transactions=('transaction_id', 'count'),
+        avg_percentile=('cat_percentile', 'mean'),
+    )
+
+    return {
+        'fraud_box': box_stats(df['amount'], fraud_label),
+        'category_box': box_stats(df['amount'], df['category']),
+        'monthly': monthly.reset_index(name='count'),
+        'top_pairs': pd.DataFrame({
+            'pair': [f"{emp} → {vendor}" for emp, vendor in top_pairs.index],
+            'count': top_pairs.to_numpy(),
+            'is_ghost': top_is_ghost,
+        }),
+        'fraud_summary': fraud_summary,
+    }
+
+
+def render_overview(aggs, path='output/forensic_audit_overview.png'):
     import seaborn as sns
+    import matplotlib
+    matplotlib.use('Agg')
     import matplotlib.pyplot as plt
 
-    os.makedirs('output', exist_ok=True)
     sns.set_style('whitegrid')
     fig, axes = plt.subplots(2, 2, figsize=(14, 10))
     fig.suptitle('Forensic Audit — Data Overview', fontsize=14, fontweight='bold')
 
     # 1. Amount distribution by fraud type
-    df_viz = df.copy()
-    df_viz['label'] = df_viz['is_fraud'].map({True: 'Fraudulent', False: 'Legitimate'})
-    sns.boxplot(data=df_viz, x='label', y='amount', ax=axes[0, 0],
-                hue='label', palette={'Legitimate': '#3498db', 'Fraudulent': '#e74c3c'}, legend=False)
+    box_colors = {'Legitimate': '#3498db', 'Fraudulent': '#e74c3c'}
+    fraud_box = sorted(aggs['fraud_box'], key=lambda b: b['label'] != 'Legitimate')
+    boxes = axes[0, 0].bxp(fraud_box, showfliers=False, patch_artist=True)
+    for patch, stats_ in zip(boxes['boxes'], fraud_box):
+        patch.set_facecolor(box_colors[stats_['label']])
     axes[0, 0].set_title('Amount Distribution: Legit vs Fraud')
-    axes[0, 0].set_xlabel('')
+    axes[0, 0].set_ylabel('amount')
 
     # 2. Amount distribution by category
-    sns.boxplot(data=df, x='category', y='amount', ax=axes[0, 1],
-                palette='Set2')
+    boxes = axes[0, 1].bxp(aggs['category_box'], showfliers=False, patch_artist=True)
+    for patch, color in zip(boxes['boxes'], sns.color_palette('Set2', len(aggs['category_box']))):
+        patch.set_facecolor(color)
     axes[0, 1].set_title('Amount Distribution by Category')
     axes[0, 1].tick_params(axis='x', rotation=30)
 
     # 3. Transactions per month
-    df_temp = df.copy()
-    df_temp['month'] = pd.to_datetime(df_temp['date']).dt.month
-    df_temp['label'] = df_temp['is_fraud'].map({True: 'Fraud', False: 'Legit'})
-    monthly = df_temp.groupby(['month', 'label']).size().reset_index(name='count')
-    sns.barplot(data=monthly, x='month', y='count', hue='label', ax=axes[1, 0],
+    sns.barplot(data=aggs['monthly'], x='month', y='count', hue='label', ax=axes[1, 0],
                 palette={'Legit': '#3498db', 'Fraud': '#e74c3c'})
     axes[1, 0].set_title('Transactions per Month')
 
     # 4. Employee-vendor pair frequency (top 20)
-    pair_freq = df.groupby(['employee_id', 'vendor_id']).size().reset_index(name='count')
-    top_pairs = pair_freq.nlargest(20, 'count')
-    top_pairs['pair'] = top_pairs['employee_id'] + ' → ' + top_pairs['vendor_id']
-    # Color ghost vendor pairs
-    fraud_pairs = df[df['fraud_type'] == 'ghost_vendor'][['employee_id', 'vendor_id']].drop_duplicates()
-    fraud_pair_set = set(zip(fraud_pairs['employee_id'], fraud_pairs['vendor_id']))
-    colors = ['#e74c3c' if (r['employee_id'], r['vendor_id']) in fraud_pair_set
-              else '#3498db' for _, r in top_pairs.iterrows()]
+    top_pairs = aggs['top_pairs']
+    colors = np.where(top_pairs['is_ghost'], '#e74c3c', '#3498db')
     axes[1, 1].barh(top_pairs['pair'], top_pairs['count'], color=colors)
     axes[1, 1].set_title('Top 20 Employee-Vendor Pairs (red = ghost)')
     axes[1, 1].invert_yaxis()
 
     plt.tight_layout()
-    plt.savefig('output/forensic_audit_overview.png', dpi=150, bbox_inches='tight')
-    print("Saved: output/forensic_audit_overview.png")
+    plt.savefig(path, dpi=150, bbox_inches='tight')
     plt.close()
+    return path
+
+
+def render_signatures(aggs, path='output/forensic_fraud_signatures.png'):
+    import seaborn as sns
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
 
     # Heatmap: fraud type signatures
     fig, ax = plt.subplots(figsize=(12, 6))
-    fraud_summary = df[df['is_fraud']].groupby('fraud_type').agg(
-        avg_amount=('amount', 'mean'),
-        std_amount=('amount', 'std'),
-        avg_zscore=('z_score', 'mean'),
-        avg_pair_freq=('pair_frequency', 'mean'),
-        total_transactions=('transaction_id', 'count'),
-        avg_percentile=('cat_percentile', 'mean'),
-    )
+    fraud_summary = aggs['fraud_summary']
     # Normalize for heatmap
     fraud_norm = (fraud_summary - fraud_summary.min()) / (fraud_summary.max() - fraud_summary.min())
     sns.heatmap(fraud_norm, annot=fraud_summary.round(2), fmt='', cmap='YlOrRd',
@@ -399,9 +461,29 @@ def create_visualizations(df):
     ax.set_title('Fraud Type Signatures (normalized heatmap)')
 
     plt.tight_layout()
-    plt.savefig('output/forensic_fraud_signatures.png', dpi=150, bbox_inches='tight')
-    print("Saved: output/forensic_fraud_signatures.png")
+    plt.savefig(path, dpi=150, bbox_inches='tight')
     plt.close()
+    return path
+
+
+def create_visualizations(df, parallel=True):
+    """Generate analysis charts from pre-computed aggregates."""
+    os.makedirs('output', exist_ok=True)
+    aggs = compute_chart_aggregates(df)
+    renderers = [render_overview, render_signatures]
+
+    # Each figure only receives the small aggregate dict, so rendering in
+    # separate processes costs nothing in serialization
+    if parallel:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=len(renderers)) as pool:
+            futures = [pool.submit(render, aggs) for render in renderers]
+            paths = [future.result() for future in futures]
+    else:
+        paths = [render(aggs) for render in renderers]
+
+    for path in paths:
+        print(f"Saved: {path}")
 
 
 # =============================================================================
@@ -421,26 +503,158 @@ def export_to_csv(df, employees, vendors):
     pd.DataFrame(vendors).to_csv('output/vendors.csv', index=False)
     print(f"Exported: output/vendors.csv ({len(vendors)} rows)")
 
-    # Ground truth summary
-    truth = df[df['is_fraud']].groupby('fraud_type').agg(
+    build_ground_truth(df).to_csv('output/ground_truth.csv', index=False)
+    print(f"Exported: output/ground_truth.csv")
+
+
+def build_ground_truth(df):
+    """Fraud breakdown per type, used to validate detections."""
+    return df[df['is_fraud']].groupby('fraud_type').agg(
         num_transactions=('transaction_id', 'count'),
         num_employees=('employee_id', 'nunique'),
         avg_amount=('amount', 'mean'),
         total_amount=('amount', 'sum'),
     ).reset_index()
-    truth.to_csv('output/ground_truth.csv', index=False)
-    print(f"Exported: output/ground_truth.csv")
 
 
-def export_to_postgres(df):
-    """Export to PostgreSQL."""
+def to_columnar_table(df):
+    """Arrow table with dictionary-encoded identifiers, int cents and date32 dates."""
+    import pyarrow as pa
+
+    dates = pd.to_datetime(df['date'])
+    columns = {
+        'transaction_id': pa.array(df['transaction_id'], pa.int32()),
+        'date': pa.array(dates.dt.date, pa.date32()),
+        'year': pa.array(dates.dt.year, pa.int16()),
+        'month': pa.array(dates.dt.month, pa.int8()),
+        'amount_cents': pa.array((df['amount'] * 100).round(), pa.int32()),
+        'invoice_number': pa.array(df['invoice_number'], pa.string()),
+        'is_fraud': pa.array(df['is_fraud'], pa.bool_()),
+    }
+    for col in DICTIONARY_COLUMNS:
+        if col in df.columns:
+            columns[col] = pa.array(df[col], pa.string()).dictionary_encode()
+    for col, arrow_type in FEATURE_COLUMN_TYPES.items():
+        if col in df.columns:
+            columns[col] = pa.array(df[col], pa.type_for_alias(arrow_type))
+    return pa.table(columns)
+
+
+def export_to_parquet(df, employees, vendors, path=COLUMNAR_DIR):
+    """Export to Parquet: transactions partitioned by year and month, entity tables as single files."""
     try:
-        from sqlalchemy import create_engine
-        db_url = f"postgresql+psycopg2://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
-        engine = create_engine(db_url)
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        ds.write_dataset(
+            to_columnar_table(df), f'{path}/transactions', format='parquet',
+            partitioning=ds.partitioning(pa.schema([('year', pa.int16()), ('month', pa.int8())]), flavor='hive'),
+            existing_data_behavior='delete_matching',
+        )
+        print(f"Exported: {path}/transactions/ ({len(df)} rows, partitioned by year and month)")
+
+        for name, frame in [('employees', pd.DataFrame(employees)),
+                            ('vendors', pd.DataFrame(vendors)),
+                            ('ground_truth', build_ground_truth(df))]:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            pq.write_table(table, f'{path}/{name}.parquet')
+            print(f"Exported: {path}/{name}.parquet ({len(frame)} rows)")
+    except ImportError as e:
+        print(f"[!] Columnar export skipped: {e}")
+
+
+def read_columnar_transactions(path=COLUMNAR_DIR, columns=None, months=None, years=None):
+    """Read the Parquet transactions back, loading only the requested columns and year/month partitions."""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(f'{path}/transactions', format='parquet', partitioning='hive')
+    wanted = None if columns is None else [
+        'amount_cents' if c == 'amount' else c for c in columns
+    ]
+    # months alone selects that calendar month in every year
+    partition_filter = None
+    for field, values in [('year', years), ('month', months)]:
+        if values:
+            condition = ds.field(field).isin(values)
+            partition_filter = condition if partition_filter is None else partition_filter & condition
+    df = dataset.to_table(columns=wanted, filter=partition_filter).to_pandas(date_as_object=False)
+
+    if 'amount_cents' in df.columns:
+        df['amount'] = df.pop('amount_cents') / 100
+    return df
+
+
+def export_to_arrow(df, path=ARROW_PATH):
+    """Export transactions as one uncompressed Arrow IPC file that readers can memory-map."""
+    try:
+        import pyarrow as pa
+
+        table = to_columnar_table(df).replace_schema_metadata({'amount_unit': 'cents'})
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        print(f"Exported: {path} ({len(df)} rows, Arrow IPC)")
+    except ImportError as e:
+        print(f"[!] Arrow export skipped: {e}")
+
+
+def read_arrow_transactions(path=ARROW_PATH, columns=None):
+    """Memory-map the Arrow transactions and convert only the requested columns."""
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(['amount_cents' if c == 'amount' else c for c in columns])
+        df = table.to_pandas(date_as_object=False)
 
-        df.to_sql('transactions', engine, if_exists='replace', index=False)
-        print(f"[+] Loaded {len(df)} rows into PostgreSQL table 'transactions'")
+    if 'amount_cents' in df.columns:
+        df['amount'] = df.pop('amount_cents') / 100
+    return df
+
+
+def load_schema_statements(path=SCHEMA_PATH):
+    """Split schema.sql into table DDL and the index statements to run after the load."""
+    with open(path) as f:
+        statements = [s.strip() for s in f.read().split(';') if s.strip()]
+    table_ddl = [s for s in statements if not s.upper().startswith('CREATE INDEX')]
+    index_ddl = [s for s in statements if s.upper().startswith('CREATE INDEX')]
+    return table_ddl, index_ddl
+
+
+def export_to_postgres(df, chunk_rows=COPY_CHUNK_ROWS):
+    """Export to PostgreSQL with COPY, using the table and indexes from schema.sql."""
+    try:
+        import io
+        import time
+        from contextlib import closing
+        import psycopg2
+
+        table_ddl, index_ddl = load_schema_statements()
+        copy_sql = f"COPY transactions ({', '.join(SCHEMA_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        start = time.perf_counter()
+
+        # closing() releases the connection even if a statement fails; 'with conn'
+        # commits the load as one transaction or rolls it back
+        with closing(psycopg2.connect(**DB_CONFIG)) as conn, conn, conn.cursor() as cursor:
+            for statement in table_ddl:
+                cursor.execute(statement)
+
+            # Stream the frame in chunks so the CSV buffer never holds the whole table
+            for offset in range(0, len(df), chunk_rows):
+                buffer = io.StringIO()
+                df.iloc[offset:offset + chunk_rows][SCHEMA_COLUMNS].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+            loaded = time.perf_counter()
+
+            # Indexes are cheaper to build once over the loaded table than to maintain per row
+            for statement in index_ddl:
+                cursor.execute(statement)
+            cursor.execute('ANALYZE transactions')
+
+        print(f"[+] Loaded {len(df)} rows into PostgreSQL table 'transactions' "
+              f"(COPY {loaded - start:.2f}s, indexes + ANALYZE {time.perf_counter() - loaded:.2f}s)")
     except Exception as e:
         print(f"[!] PostgreSQL export failed: {e}")
         print("    CSV files are still available in output/")
@@ -450,11 +664,8 @@ def export_to_postgres(df):
 # MAIN
 # =============================================================================
 
-def main():
-    print("=" * 70)
-    print("  FORENSIC AUDIT — DATA GENERATION")
-    print("=" * 70)
-
+def generate_dataset():
+    """Create entities, generate and inject transactions, and compute features."""
     # Create entities
     print("\n[*] Creating employees and vendors...")
     employees = create_employees()
@@ -498,6 +709,44 @@ def main():
     print("\n[*] Calculating statistical features...")
     df = add_statistical_features(df)
 
+    return {
+        'transactions': df,
+        'employees': employees,
+        'vendors': vendors,
+        'ground_truth': build_ground_truth(df),
+    }
+
+
+def dataset_fingerprint():
+    """Hash of everything that determines the generated dataset: config, seed and this file's code."""
+    config = {
+        'seed': SEED,
+        'num_transactions': NUM_TRANSACTIONS,
+        'num_employees': NUM_EMPLOYEES,
+        'num_vendors': NUM_VENDORS,
+        'approval_threshold': APPROVAL_THRESHOLD,
+        'fraud_ratio': FRAUD_RATIO,
+        'categories': CATEGORIES,
+        'fraud_types': FRAUD_TYPES,
+    }
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    with open(os.path.abspath(__file__), 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def main(use_cache=True):
+    print("=" * 70)
+    print("  FORENSIC AUDIT — DATA GENERATION")
+    print("=" * 70)
+
+    # Reruns with the same config, seed and code load the previous result from disk
+    if use_cache:
+        dataset = StageCache().cached(dataset_fingerprint(), generate_dataset)
+    else:
+        dataset = generate_dataset()
+    df, employees, vendors = dataset['transactions'], dataset['employees'], dataset['vendors']
+
     # Summary
     total_fraud = df['is_fraud'].sum()
     print(f"\n{'=' * 70}")
@@ -513,6 +762,8 @@ def main():
     # Export
     print(f"\n[*] Exporting...")
     export_to_csv(df, employees, vendors)
+    export_to_parquet(df, employees, vendors)
+    export_to_arrow(df)
 #    export_to_postgres(df)
 
     # Visualize
@@ -525,4 +776,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    import sys
+    main(use_cache='--no-cache' not in sys.argv)
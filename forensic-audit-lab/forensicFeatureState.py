@@ -0,0 +1,270 @@
+import os
+import pickle
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from quantileSketch import KLLSketch
+
+STATE_PATH = 'output/feature_state.pkl'
+FEATURES_PATH = 'output/transactions.csv'
+
+
+# =============================================================================
+# FEATURE STATE
+# =============================================================================
+# add_statistical_features() recomputes everything over the full history.
+# FeatureState keeps the same statistics as running accumulators so a daily
+# batch only touches the categories, pairs and employees it contains:
+#   - per category: count / mean / M2 (Welford, merged with Chan's formula)
+#     plus the sorted amounts used for the exact percentile rank, or a
+#     KLL sketch when sketch_k is set (approximate, bounded memory)
+#   - per (employee_id, vendor_id): transaction count
+#   - per employee_id: total spend
+# It also records the id of every batch it has applied, so replaying the
+# same batch is a no-op instead of counting it twice.
+
+class FeatureState:
+
+    def __init__(self, sketch_k=None):
+        self.sketch_k = sketch_k
+        self.cat_sketches = {}
+        self.cat_count = {}
+        self.cat_mean = {}
+        self.cat_m2 = {}
+        self.cat_amounts = {}
+        self.pair_counts = pd.Series(
+            dtype='int64',
+            index=pd.MultiIndex.from_tuples([], names=['employee_id', 'vendor_id']),
+        )
+        self.emp_spend = pd.Series(dtype='float64', index=pd.Index([], name='employee_id'))
+        self.rows_seen = 0
+        self.batches = []
+
+    @property
+    def last_batch(self):
+        return self.batches[-1] if self.batches else None
+
+    def ingest(self, batch):
+        """Fold a batch of transactions into the accumulators and return the touched keys."""
+        grouped = batch.groupby('category')['amount']
+        for category, amounts in grouped:
+            values = amounts.to_numpy(dtype='float64')
+            n_b = len(values)
+            mean_b = values.mean()
+            m2_b = ((values - mean_b) ** 2).sum()
+
+            n_a = self.cat_count.get(category, 0)
+            mean_a = self.cat_mean.get(category, 0.0)
+            m2_a = self.cat_m2.get(category, 0.0)
+            n = n_a + n_b
+            delta = mean_b - mean_a
+
+            self.cat_count[category] = n
+            self.cat_mean[category] = mean_a + delta * n_b / n
+            self.cat_m2[category] = m2_a + m2_b + delta ** 2 * n_a * n_b / n
+
+            if self.sketch_k:
+                self.cat_sketches.setdefault(category, KLLSketch(k=self.sketch_k)).update(values)
+            else:
+                # Merge into the sorted history instead of re-sorting it:
+                # only the batch is sorted, the insert is one linear pass
+                previous = self.cat_amounts.get(category, np.empty(0))
+                values = np.sort(values)
+                self.cat_amounts[category] = np.insert(
+                    previous, np.searchsorted(previous, values, side='right'), values)
+
+        pairs = batch.groupby(['employee_id', 'vendor_id']).size()
+        self.pair_counts = self.pair_counts.add(pairs, fill_value=0).astype('int64')
+
+        spend = batch.groupby('employee_id')['amount'].sum()
+        self.emp_spend = self.emp_spend.add(spend, fill_value=0.0)
+
+        self.rows_seen += len(batch)
+
+        return {
+            'categories': set(grouped.groups.keys()),
+            'pairs': set(pairs.index),
+            'employees': set(spend.index),
+        }
+
+    def cat_std(self, category):
+        n = self.cat_count[category]
+        return np.sqrt(self.cat_m2[category] / (n - 1)) if n > 1 else np.nan
+
+    def z_scores(self, df):
+        mean = df['category'].map(self.cat_mean)
+        std = df['category'].map({c: self.cat_std(c) for c in self.cat_count})
+        return (df['amount'] - mean) / std
+
+    def percentiles(self, df):
+        # Same as rank(pct=True) with method='average': ties share the mean rank
+        result = pd.Series(np.nan, index=df.index)
+        for category, idx in df.groupby('category').groups.items():
+            values = df.loc[idx, 'amount'].to_numpy(dtype='float64')
+            if self.sketch_k:
+                result.loc[idx] = self.cat_sketches[category].rank(values)
+                continue
+            sorted_amounts = self.cat_amounts[category]
+            left = np.searchsorted(sorted_amounts, values, side='left')
+            right = np.searchsorted(sorted_amounts, values, side='right')
+            result.loc[idx] = (left + right + 1) / 2 / len(sorted_amounts)
+        return result
+
+    def pair_frequency(self, df):
+        keys = pd.MultiIndex.from_frame(df[['employee_id', 'vendor_id']])
+        return pd.Series(self.pair_counts.reindex(keys).to_numpy(), index=df.index)
+
+    def employee_spend(self, df):
+        return df['employee_id'].map(self.emp_spend)
+
+    def save(self, path=STATE_PATH):
+        write_atomic(path, lambda f: pickle.dump(self, f))
+
+    @classmethod
+    def load(cls, path=STATE_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        # States saved before batch ids were recorded
+        if not hasattr(state, 'batches'):
+            state.batches = []
+        return state
+
+
+def write_atomic(path, write):
+    """Write through a temp file and rename it, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def batch_id(batch):
+    """Content hash of a batch, independent of where it was read from."""
+    hashed = pd.util.hash_pandas_object(batch, index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+# =============================================================================
+# FEATURE MAINTENANCE
+# =============================================================================
+
+def rebuild_features(df, state=None):
+    """Full rebuild: same columns as add_statistical_features(), computed from a fresh state."""
+    state = state or FeatureState()
+    state.ingest(df)
+
+    df = df.copy()
+    df['z_score'] = state.z_scores(df)
+    df['pair_frequency'] = state.pair_frequency(df)
+    df['employee_total_spend'] = state.employee_spend(df)
+    df['cat_percentile'] = state.percentiles(df)
+    return df, state
+
+
+def append_batch(features, batch, state):
+    """Ingest a new batch and refresh features only for rows whose keys changed."""
+    current_id = batch_id(batch)
+    if current_id in state.batches:
+        print(f"[!] Batch {current_id} was already applied, skipping")
+        return features
+    # Rows already in the features (a replay after a crash) are not counted again
+    batch = batch[~batch['transaction_id'].isin(features['transaction_id'])]
+    state.batches.append(current_id)
+    if batch.empty:
+        return features
+
+    touched = state.ingest(batch)
+    df = pd.concat([features, batch], ignore_index=True)
+
+    cat_mask = df['category'].isin(touched['categories'])
+    if cat_mask.any():
+        rows = df[cat_mask]
+        df.loc[cat_mask, 'z_score'] = state.z_scores(rows)
+        df.loc[cat_mask, 'cat_percentile'] = state.percentiles(rows)
+
+    pair_keys = pd.MultiIndex.from_frame(df[['employee_id', 'vendor_id']])
+    pair_mask = pair_keys.isin(list(touched['pairs']))
+    if pair_mask.any():
+        df.loc[pair_mask, 'pair_frequency'] = state.pair_frequency(df[pair_mask])
+
+    emp_mask = df['employee_id'].isin(touched['employees'])
+    if emp_mask.any():
+        df.loc[emp_mask, 'employee_total_spend'] = state.employee_spend(df[emp_mask])
+
+    df['pair_frequency'] = df['pair_frequency'].astype('int64')
+    return df
+
+
+def verify_against_full_rebuild(df, rtol=1e-9):
+    """Check the incremental state against add_statistical_features() on the same rows."""
+    from forensicAuditScript import add_statistical_features
+
+    expected = add_statistical_features(df).sort_values('transaction_id').reset_index(drop=True)
+    actual, _ = rebuild_features(df)
+    actual = actual.sort_values('transaction_id').reset_index(drop=True)
+
+    for col in ['z_score', 'pair_frequency', 'employee_total_spend', 'cat_percentile']:
+        if not np.allclose(expected[col], actual[col], rtol=rtol, atol=0, equal_nan=True):
+            raise AssertionError(f"Feature '{col}' differs from full rebuild")
+    return True
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain forensic features incrementally.')
+    parser.add_argument('batch', nargs='?', help='CSV with newly appended transactions')
+    parser.add_argument('--features', default=FEATURES_PATH)
+    parser.add_argument('--state', default=STATE_PATH)
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the state from the features file')
+    parser.add_argument('--sketch-k', type=int, default=None,
+                        help='Use KLL sketches of this size for cat_percentile instead of exact ranks '
+                             '(a loaded state with a different k is rebuilt)')
+    args = parser.parse_args()
+
+    base_cols = ['transaction_id', 'date', 'employee_id', 'vendor_id', 'amount',
+                 'category', 'invoice_number', 'is_fraud', 'fraud_type']
+
+    state = None
+    if not args.rebuild and os.path.exists(args.state):
+        state = FeatureState.load(args.state)
+        features = pd.read_csv(args.features)
+        print(f"[*] Loaded feature state ({state.rows_seen} rows)")
+        if state.rows_seen != len(features):
+            # The features and the state were not saved together (interrupted run).
+            # The rebuilt state starts with no batch ids; transaction_id dedup in
+            # append_batch keeps a replayed batch from being counted twice.
+            print(f"[!] State covers {state.rows_seen} rows but {args.features} has {len(features)}, rebuilding")
+            state = None
+        elif args.sketch_k is not None and args.sketch_k != state.sketch_k:
+            # Sketches of different k cannot be resized in place; recompute cat_percentile with the new k
+            print(f"[!] State uses --sketch-k {state.sketch_k} but {args.sketch_k} was requested, rebuilding")
+            state = None
+
+    if state is None:
+        print(f"[*] Rebuilding feature state from {args.features}...")
+        history = pd.read_csv(args.features)[base_cols]
+        features, state = rebuild_features(history, FeatureState(sketch_k=args.sketch_k))
+
+    if args.batch:
+        batch = pd.read_csv(args.batch)[base_cols]
+        print(f"[*] Appending {len(batch)} transactions...")
+        features = append_batch(features, batch, state)
+
+    # Features first, state last: an interrupted run leaves the state behind
+    # the features, which the row count check above detects and repairs
+    write_atomic(args.features, lambda f: features.to_csv(f, index=False))
+    state.save(args.state)
+    print(f"[+] Saved {len(features)} rows to {args.features} and state to {args.state}")
+
+
+if __name__ == "__main__":
+    main()
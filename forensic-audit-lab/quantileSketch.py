@@ -0,0 +1,142 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+
+# =============================================================================
+# KLL QUANTILE SKETCH
+# =============================================================================
+# cat_percentile and the PERCENT_RANK() in the inflated amount query both sort
+# every category on every run. A KLL sketch keeps a few hundred weighted
+# samples per category instead: each level holds items of weight 2^h, and when
+# a level overflows it is sorted and every other item is promoted. Sketches
+# built on different shards merge by concatenating levels and compacting.
+#
+# Worst-case rank error stays around 2 / k of n (k=200 -> ~1 percentile point).
+
+class KLLSketch:
+
+    def __init__(self, k=200, seed=3003):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_error(cls, eps, seed=3003):
+        """Build a sketch sized for a target rank error (fraction of n)."""
+        return cls(k=max(8, math.ceil(2 / eps)), seed=seed)
+
+    @property
+    def error_bound(self):
+        return 2 / self.k
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item stays behind so total weight is preserved
+                keep = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(keep)]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = keep
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype='float64').ravel()
+        if len(values) == 0:
+            return self
+        # Large batches are fed in k-sized slices so the level-0 buffer stays bounded
+        for start in range(0, len(values), self.k):
+            chunk = values[start:start + self.k]
+            self.levels[0] = np.concatenate([self.levels[0], chunk])
+            self.n += len(chunk)
+            self._compress()
+        return self
+
+    def merge(self, other):
+        """Fold another sketch into this one (in place) and return self."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lv), 2 ** h) for h, lv in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def rank(self, values):
+        """Approximate rank(pct=True) of each value, ties averaged like pandas."""
+        items, cum = self._weighted()
+        values = np.asarray(values, dtype='float64')
+        cum = np.concatenate([[0], cum])
+        below = cum[np.searchsorted(items, values, side='left')]
+        upto = cum[np.searchsorted(items, values, side='right')]
+        return (below + upto + 1) / 2 / self.n
+
+    def percent_rank(self, values):
+        """Approximate PERCENT_RANK(): share of other rows strictly below each value."""
+        items, cum = self._weighted()
+        cum = np.concatenate([[0], cum])
+        below = cum[np.searchsorted(items, np.asarray(values, dtype='float64'), side='left')]
+        return below / max(self.n - 1, 1)
+
+    def quantile(self, q):
+        items, cum = self._weighted()
+        targets = np.asarray(q, dtype='float64') * self.n
+        idx = np.clip(np.searchsorted(cum, targets, side='left'), 0, len(items) - 1)
+        return items[idx]
+
+
+# =============================================================================
+# CATEGORY SKETCHES
+# =============================================================================
+
+def build_category_sketches(df, k=200):
+    """One sketch per category, built from a single partition of the ledger."""
+    return {
+        category: KLLSketch(k=k).update(amounts.to_numpy())
+        for category, amounts in df.groupby('category')['amount']
+    }
+
+
+def merge_category_sketches(partitions):
+    """Merge per-partition sketch dicts (e.g. one per shard or per day)."""
+    merged = {}
+    for sketches in partitions:
+        for category, sketch in sketches.items():
+            if category in merged:
+                merged[category].merge(sketch)
+            else:
+                merged[category] = KLLSketch(k=sketch.k).merge(sketch)
+    return merged
+
+
+def approx_cat_percentile(df, sketches):
+    """Sketch-based replacement for df.groupby('category')['amount'].rank(pct=True)."""
+    result = pd.Series(np.nan, index=df.index)
+    for category, idx in df.groupby('category').groups.items():
+        result.loc[idx] = sketches[category].rank(df.loc[idx, 'amount'].to_numpy())
+    return result
+
+
+def sharded_cat_percentile(df, num_shards=4, k=200):
+    """Build sketches per shard, merge them and rank every row against the merge."""
+    shards = np.array_split(np.arange(len(df)), num_shards)
+    partitions = [build_category_sketches(df.iloc[rows], k=k) for rows in shards]
+    return approx_cat_percentile(df, merge_category_sketches(partitions))
@@ -0,0 +1,33 @@
+-- DUPLICATE INVOICE DETECTION
+WITH exact_duplicates AS (
+    SELECT
+        invoice_number,
+        COUNT(*) AS times_submitted,
+        STRING_AGG(DISTINCT employee_id, ', ') AS employees_involved,
+        MIN(amount) AS min_amount,
+        MAX(amount) AS max_amount,
+        ROUND(ABS(MAX(amount) - MIN(amount)) / NULLIF(MIN(amount), 0) * 100, 2) AS pct_difference,
+        MIN(date)::TEXT AS first_submitted,
+        MAX(date)::TEXT AS last_submitted,
+        MAX(date) - MIN(date) AS days_apart
+    FROM transactions
+    GROUP BY invoice_number
+    HAVING COUNT(*) > 1
+)
+SELECT
+    invoice_number,
+    times_submitted,
+    employees_involved,
+    min_amount,
+    max_amount,
+    pct_difference,
+    first_submitted,
+    last_submitted,
+    days_apart,
+    CASE
+        WHEN pct_difference < 1 THEN 'EXACT COPY'
+        WHEN pct_difference < 5 THEN 'NEAR DUPLICATE'
+        ELSE 'AMOUNT MISMATCH'
+    END AS duplicate_type
+FROM exact_duplicates
+ORDER BY pct_difference ASC;
@@ -0,0 +1,9 @@
+-- NEW TRANSACTIONS SINCE THE WATERMARK
+-- Range scan on the transaction_id primary key: cost follows the new rows only.
+DROP TABLE IF EXISTS audit_delta;
+CREATE UNLOGGED TABLE audit_delta AS
+SELECT transaction_id, date, employee_id, vendor_id, category, amount, invoice_number
+FROM transactions
+WHERE transaction_id > %(watermark)s;
+
+ANALYZE audit_delta;
@@ -0,0 +1,37 @@
+-- INCREMENTAL AUDIT STATE
+-- High-water mark of the last audited transaction and the merged findings
+-- of every detector, keyed by the entity each finding is about.
+CREATE TABLE IF NOT EXISTS audit_watermark (
+    id                  INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    last_transaction_id INT NOT NULL,
+    last_date           DATE NOT NULL,
+    updated_at          TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS audit_findings (
+    detector    VARCHAR(30) NOT NULL,
+    finding_key TEXT NOT NULL,
+    finding     JSONB NOT NULL,
+    updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (detector, finding_key)
+);
+
+-- Inflated-amount state: per-category cut points and, per employee, how many
+-- transactions fell above them. New rows are ranked against the stored cut
+-- points instead of re-ranking whole categories.
+CREATE TABLE IF NOT EXISTS audit_category_quantiles (
+    category    VARCHAR(50) PRIMARY KEY,
+    p75         DECIMAL(10, 2) NOT NULL,
+    p90         DECIMAL(10, 2) NOT NULL,
+    row_count   INT NOT NULL,
+    updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS audit_employee_amounts (
+    employee_id         VARCHAR(10) PRIMARY KEY,
+    category            VARCHAR(50) NOT NULL,
+    total_transactions  INT NOT NULL,
+    amount_sum          DECIMAL(14, 2) NOT NULL,
+    top_quartile        INT NOT NULL,
+    top_decile          INT NOT NULL
+);
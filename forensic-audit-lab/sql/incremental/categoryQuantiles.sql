@@ -0,0 +1,15 @@
+-- CATEGORY CUT POINTS FOR THE INFLATED-AMOUNT DETECTOR
+-- Categories seen for the first time take their 75th / 90th percentiles from
+-- the rows that introduced them; stored categories keep theirs until the next
+-- full seed. On the seed run audit_delta holds every transaction, so this is
+-- the whole-table percentile.
+INSERT INTO audit_category_quantiles (category, p75, p90, row_count)
+SELECT
+    category,
+    PERCENTILE_CONT(0.75) WITHIN GROUP (ORDER BY amount),
+    PERCENTILE_CONT(0.90) WITHIN GROUP (ORDER BY amount),
+    COUNT(*)
+FROM audit_delta
+WHERE category NOT IN (SELECT category FROM audit_category_quantiles)
+GROUP BY category
+ON CONFLICT (category) DO NOTHING;
@@ -0,0 +1,21 @@
+-- FOLD NEW TRANSACTIONS INTO THE PER-EMPLOYEE AMOUNT COUNTERS
+-- Runs in the same transaction that merges the findings and advances the
+-- watermark, so each row is counted exactly once.
+INSERT INTO audit_employee_amounts
+    (employee_id, category, total_transactions, amount_sum, top_quartile, top_decile)
+SELECT
+    d.employee_id,
+    MIN(d.category),
+    COUNT(*),
+    SUM(d.amount),
+    SUM(CASE WHEN d.amount > q.p75 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN d.amount > q.p90 THEN 1 ELSE 0 END)
+FROM audit_delta d
+JOIN audit_category_quantiles q USING (category)
+GROUP BY d.employee_id
+ON CONFLICT (employee_id) DO UPDATE SET
+    category = LEAST(audit_employee_amounts.category, EXCLUDED.category),
+    total_transactions = audit_employee_amounts.total_transactions + EXCLUDED.total_transactions,
+    amount_sum = audit_employee_amounts.amount_sum + EXCLUDED.amount_sum,
+    top_quartile = audit_employee_amounts.top_quartile + EXCLUDED.top_quartile,
+    top_decile = audit_employee_amounts.top_decile + EXCLUDED.top_decile;
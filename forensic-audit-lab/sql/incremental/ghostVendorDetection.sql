@@ -0,0 +1,28 @@
+-- GHOST VENDOR DETECTION (vendors touched by new transactions)
+WITH vendor_profile AS (
+    SELECT
+        vendor_id,
+        COUNT(DISTINCT employee_id) AS unique_employees,
+        COUNT(*) AS total_transactions,
+        ROUND(AVG(amount), 2) AS avg_amount,
+        ROUND(SUM(amount), 2) AS total_amount,
+        STRING_AGG(DISTINCT employee_id, ', ') AS employees
+    FROM transactions
+    WHERE vendor_id IN (SELECT vendor_id FROM audit_delta)
+    GROUP BY vendor_id
+)
+SELECT
+    vendor_id,
+    unique_employees,
+    employees,
+    total_transactions,
+    avg_amount,
+    total_amount,
+    CASE
+        WHEN unique_employees = 1 THEN 'CRITICAL'
+        WHEN unique_employees <= 3 THEN 'HIGH'
+        ELSE 'LOW'
+    END AS risk_level
+FROM vendor_profile
+WHERE unique_employees <= 3
+ORDER BY unique_employees ASC, total_amount DESC;
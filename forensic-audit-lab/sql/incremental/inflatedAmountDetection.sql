@@ -0,0 +1,45 @@
+-- INFLATED AMOUNT DETECTION (employees touched by new transactions)
+-- Only the new rows are ranked, against the stored category cut points
+-- (audit_category_quantiles); each employee's earlier counts come from
+-- audit_employee_amounts. Cost follows the delta, not the category size.
+WITH delta_emp AS (
+    SELECT
+        d.employee_id,
+        MIN(d.category) AS category,
+        COUNT(*) AS total_transactions,
+        SUM(d.amount) AS amount_sum,
+        SUM(CASE WHEN d.amount > q.p75 THEN 1 ELSE 0 END) AS top_quartile,
+        SUM(CASE WHEN d.amount > q.p90 THEN 1 ELSE 0 END) AS top_decile
+    FROM audit_delta d
+    JOIN audit_category_quantiles q USING (category)
+    GROUP BY d.employee_id
+),
+emp_dist AS (
+    SELECT
+        d.employee_id,
+        LEAST(d.category, s.category) AS category,
+        d.total_transactions + COALESCE(s.total_transactions, 0) AS total_transactions,
+        ROUND((d.amount_sum + COALESCE(s.amount_sum, 0))
+              / (d.total_transactions + COALESCE(s.total_transactions, 0)), 2) AS emp_avg,
+        ROUND((d.top_quartile + COALESCE(s.top_quartile, 0))::NUMERIC
+              / (d.total_transactions + COALESCE(s.total_transactions, 0)) * 100, 1) AS pct_top_quartile,
+        ROUND((d.top_decile + COALESCE(s.top_decile, 0))::NUMERIC
+              / (d.total_transactions + COALESCE(s.total_transactions, 0)) * 100, 1) AS pct_top_decile
+    FROM delta_emp d
+    LEFT JOIN audit_employee_amounts s USING (employee_id)
+)
+SELECT
+    employee_id,
+    category,
+    total_transactions,
+    emp_avg,
+    pct_top_quartile,
+    pct_top_decile,
+    CASE
+        WHEN pct_top_quartile > 35 AND pct_top_decile > 15 THEN 'HIGH'
+        WHEN pct_top_quartile > 30 THEN 'MEDIUM'
+        ELSE 'LOW'
+    END AS risk_level
+FROM emp_dist
+WHERE pct_top_quartile > 28
+ORDER BY pct_top_quartile DESC;
@@ -0,0 +1,37 @@
+-- SPLIT PURCHASE DETECTION (groups touched by new transactions)
+WITH touched AS (
+    SELECT DISTINCT employee_id, vendor_id, date
+    FROM audit_delta
+),
+daily_groups AS (
+    SELECT
+        t.employee_id,
+        t.vendor_id,
+        t.date,
+        COUNT(*) AS num_transactions,
+        SUM(t.amount) AS group_total,
+        MAX(t.amount) AS max_single,
+        ROUND(AVG(t.amount), 2) AS avg_fragment,
+        STRING_AGG(t.transaction_id::TEXT, ', ') AS transaction_ids
+    FROM transactions t
+    JOIN touched USING (employee_id, vendor_id, date)
+    GROUP BY t.employee_id, t.vendor_id, t.date
+)
+SELECT
+    employee_id,
+    vendor_id,
+    date::TEXT,
+    num_transactions AS fragments,
+    group_total AS real_total,
+    max_single,
+    avg_fragment,
+    CASE
+        WHEN group_total > 7000 AND num_transactions >= 4 THEN 'CRITICAL'
+        WHEN group_total > 5000 AND num_transactions >= 3 THEN 'HIGH'
+        ELSE 'MEDIUM'
+    END AS risk_level
+FROM daily_groups
+WHERE num_transactions > 1
+  AND group_total > 5000
+  AND max_single < 5000
+ORDER BY group_total DESC;
@@ -0,0 +1,35 @@
+-- INFLATED AMOUNT DETECTION
+WITH ranked AS (
+    SELECT
+        employee_id,
+        category,
+        amount,
+        PERCENT_RANK() OVER (PARTITION BY category ORDER BY amount) AS cat_percentile
+    FROM transactions
+),
+emp_dist AS (
+    SELECT
+        employee_id,
+        MIN(category) AS category,
+        COUNT(*) AS total_transactions,
+        ROUND(AVG(amount), 2) AS emp_avg,
+        ROUND(SUM(CASE WHEN cat_percentile > 0.75 THEN 1 ELSE 0 END)::NUMERIC / COUNT(*) * 100, 1) AS pct_top_quartile,
+        ROUND(SUM(CASE WHEN cat_percentile > 0.90 THEN 1 ELSE 0 END)::NUMERIC / COUNT(*) * 100, 1) AS pct_top_decile
+    FROM ranked
+    GROUP BY employee_id
+)
+SELECT
+    employee_id,
+    category,
+    total_transactions,
+    emp_avg,
+    pct_top_quartile,
+    pct_top_decile,
+    CASE
+        WHEN pct_top_quartile > 35 AND pct_top_decile > 15 THEN 'HIGH'
+        WHEN pct_top_quartile > 30 THEN 'MEDIUM'
+        ELSE 'LOW'
+    END AS risk_level
+FROM emp_dist
+WHERE pct_top_quartile > 28
+ORDER BY pct_top_quartile DESC;
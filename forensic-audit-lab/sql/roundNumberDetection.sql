@@ -0,0 +1,31 @@
+-- ROUND NUMBER DETECTION
+WITH round_flagged AS (
+    SELECT
+        employee_id,
+        COUNT(*) AS total_transactions,
+        SUM(CASE WHEN MOD(amount::INT, 500) = 0 AND MOD(amount, 1) = 0 THEN 1 ELSE 0 END) AS round_count,
+        ROUND(
+            SUM(CASE WHEN MOD(amount::INT, 500) = 0 AND MOD(amount, 1) = 0 THEN 1 ELSE 0 END)::NUMERIC
+            / COUNT(*) * 100, 1
+        ) AS round_pct,
+        STRING_AGG(
+            DISTINCT CASE WHEN MOD(amount::INT, 500) = 0 AND MOD(amount, 1) = 0 THEN amount::TEXT END, ', '
+        ) AS round_amounts_used
+    FROM transactions
+    GROUP BY employee_id
+)
+SELECT
+    employee_id,
+    total_transactions,
+    round_count,
+    round_pct,
+    round_amounts_used,
+    CASE
+        WHEN round_pct > 10 THEN 'CRITICAL'
+        WHEN round_pct > 5 THEN 'HIGH'
+        WHEN round_pct > 2 THEN 'MEDIUM'
+        ELSE 'LOW'
+    END AS risk_level
+FROM round_flagged
+WHERE round_count > 0
+ORDER BY round_pct DESC;
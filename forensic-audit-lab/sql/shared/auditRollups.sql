@@ -0,0 +1,117 @@
+-- SHARED AUDIT ROLLUPS
+-- Built once per audit run. A single scan of transactions feeds every
+-- detector in sql/shared/: the per-row percentile and round flags are
+-- computed once and folded into an employee x vendor x date rollup, and
+-- the same scan also materializes the repeated invoices.
+DROP TABLE IF EXISTS audit_emp_vendor_day, audit_invoice_rollup, audit_emp_profile, audit_vendor_profile;
+
+CREATE UNLOGGED TABLE audit_emp_vendor_day (
+    employee_id         VARCHAR(10) NOT NULL,
+    vendor_id           VARCHAR(10) NOT NULL,
+    date                DATE NOT NULL,
+    category            VARCHAR(50) NOT NULL,
+    num_transactions    INT NOT NULL,
+    group_total         DECIMAL(14, 2) NOT NULL,
+    max_single          DECIMAL(10, 2) NOT NULL,
+    round_count         INT NOT NULL,
+    top_quartile_count  INT NOT NULL,
+    top_decile_count    INT NOT NULL,
+    round_amounts       TEXT[]
+);
+
+CREATE UNLOGGED TABLE audit_invoice_rollup (
+    invoice_number      VARCHAR(50) PRIMARY KEY,
+    times_submitted     INT NOT NULL,
+    employees_involved  TEXT NOT NULL,
+    min_amount          DECIMAL(10, 2) NOT NULL,
+    max_amount          DECIMAL(10, 2) NOT NULL,
+    first_submitted     DATE NOT NULL,
+    last_submitted      DATE NOT NULL
+);
+
+WITH ranked AS MATERIALIZED (
+    SELECT
+        employee_id,
+        vendor_id,
+        date,
+        category,
+        amount,
+        invoice_number,
+        PERCENT_RANK() OVER (PARTITION BY category ORDER BY amount) AS cat_percentile,
+        (MOD(amount::INT, 500) = 0 AND MOD(amount, 1) = 0) AS is_round
+    FROM transactions
+),
+invoices AS (
+    INSERT INTO audit_invoice_rollup
+    SELECT
+        invoice_number,
+        COUNT(*),
+        STRING_AGG(DISTINCT employee_id, ', '),
+        MIN(amount),
+        MAX(amount),
+        MIN(date),
+        MAX(date)
+    FROM ranked
+    GROUP BY invoice_number
+    HAVING COUNT(*) > 1
+)
+INSERT INTO audit_emp_vendor_day
+SELECT
+    employee_id,
+    vendor_id,
+    date,
+    MIN(category),
+    COUNT(*),
+    SUM(amount),
+    MAX(amount),
+    SUM(CASE WHEN is_round THEN 1 ELSE 0 END),
+    SUM(CASE WHEN cat_percentile > 0.75 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN cat_percentile > 0.90 THEN 1 ELSE 0 END),
+    ARRAY_AGG(DISTINCT amount::TEXT) FILTER (WHERE is_round)
+FROM ranked
+GROUP BY employee_id, vendor_id, date;
+
+-- Per-employee amount profile (inflated amount, round number)
+CREATE UNLOGGED TABLE audit_emp_profile AS
+SELECT
+    p.employee_id,
+    p.category,
+    p.total_transactions,
+    p.total_amount,
+    p.round_count,
+    p.top_quartile_count,
+    p.top_decile_count,
+    r.round_amounts_used
+FROM (
+    SELECT
+        employee_id,
+        MIN(category) AS category,
+        SUM(num_transactions) AS total_transactions,
+        SUM(group_total) AS total_amount,
+        SUM(round_count) AS round_count,
+        SUM(top_quartile_count) AS top_quartile_count,
+        SUM(top_decile_count) AS top_decile_count
+    FROM audit_emp_vendor_day
+    GROUP BY employee_id
+) p
+LEFT JOIN (
+    SELECT employee_id, STRING_AGG(DISTINCT amount, ', ') AS round_amounts_used
+    FROM audit_emp_vendor_day, UNNEST(round_amounts) AS amount
+    GROUP BY employee_id
+) r ON r.employee_id = p.employee_id;
+
+-- Per-vendor exclusivity stats (ghost vendor)
+CREATE UNLOGGED TABLE audit_vendor_profile AS
+SELECT
+    vendor_id,
+    COUNT(DISTINCT employee_id) AS unique_employees,
+    SUM(num_transactions) AS total_transactions,
+    SUM(group_total) AS total_amount,
+    STRING_AGG(DISTINCT employee_id, ', ') AS employees
+FROM audit_emp_vendor_day
+GROUP BY vendor_id;
+
+ANALYZE audit_emp_vendor_day;
+ANALYZE audit_invoice_rollup;
+ANALYZE audit_emp_profile;
+ANALYZE audit_vendor_profile;
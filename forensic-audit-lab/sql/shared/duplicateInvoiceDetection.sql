@@ -0,0 +1,31 @@
+-- DUPLICATE INVOICE DETECTION (reads audit_invoice_rollup)
+WITH exact_duplicates AS (
+    SELECT
+        invoice_number,
+        times_submitted,
+        employees_involved,
+        min_amount,
+        max_amount,
+        ROUND(ABS(max_amount - min_amount) / NULLIF(min_amount, 0) * 100, 2) AS pct_difference,
+        first_submitted::TEXT AS first_submitted,
+        last_submitted::TEXT AS last_submitted,
+        last_submitted - first_submitted AS days_apart
+    FROM audit_invoice_rollup
+)
+SELECT
+    invoice_number,
+    times_submitted,
+    employees_involved,
+    min_amount,
+    max_amount,
+    pct_difference,
+    first_submitted,
+    last_submitted,
+    days_apart,
+    CASE
+        WHEN pct_difference < 1 THEN 'EXACT COPY'
+        WHEN pct_difference < 5 THEN 'NEAR DUPLICATE'
+        ELSE 'AMOUNT MISMATCH'
+    END AS duplicate_type
+FROM exact_duplicates
+ORDER BY pct_difference ASC;
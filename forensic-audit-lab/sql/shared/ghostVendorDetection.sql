@@ -0,0 +1,16 @@
+-- GHOST VENDOR DETECTION (reads audit_vendor_profile)
+SELECT
+    vendor_id,
+    unique_employees,
+    employees,
+    total_transactions,
+    ROUND(total_amount / total_transactions, 2) AS avg_amount,
+    ROUND(total_amount, 2) AS total_amount,
+    CASE
+        WHEN unique_employees = 1 THEN 'CRITICAL'
+        WHEN unique_employees <= 3 THEN 'HIGH'
+        ELSE 'LOW'
+    END AS risk_level
+FROM audit_vendor_profile
+WHERE unique_employees <= 3
+ORDER BY unique_employees ASC, total_amount DESC;
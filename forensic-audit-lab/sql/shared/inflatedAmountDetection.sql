@@ -0,0 +1,26 @@
+-- INFLATED AMOUNT DETECTION (reads audit_emp_profile)
+WITH emp_dist AS (
+    SELECT
+        employee_id,
+        category,
+        total_transactions,
+        ROUND(total_amount / total_transactions, 2) AS emp_avg,
+        ROUND(top_quartile_count::NUMERIC / total_transactions * 100, 1) AS pct_top_quartile,
+        ROUND(top_decile_count::NUMERIC / total_transactions * 100, 1) AS pct_top_decile
+    FROM audit_emp_profile
+)
+SELECT
+    employee_id,
+    category,
+    total_transactions,
+    emp_avg,
+    pct_top_quartile,
+    pct_top_decile,
+    CASE
+        WHEN pct_top_quartile > 35 AND pct_top_decile > 15 THEN 'HIGH'
+        WHEN pct_top_quartile > 30 THEN 'MEDIUM'
+        ELSE 'LOW'
+    END AS risk_level
+FROM emp_dist
+WHERE pct_top_quartile > 28
+ORDER BY pct_top_quartile DESC;
@@ -0,0 +1,25 @@
+-- ROUND NUMBER DETECTION (reads audit_emp_profile)
+WITH round_flagged AS (
+    SELECT
+        employee_id,
+        total_transactions,
+        round_count,
+        ROUND(round_count::NUMERIC / total_transactions * 100, 1) AS round_pct,
+        round_amounts_used
+    FROM audit_emp_profile
+)
+SELECT
+    employee_id,
+    total_transactions,
+    round_count,
+    round_pct,
+    round_amounts_used,
+    CASE
+        WHEN round_pct > 10 THEN 'CRITICAL'
+        WHEN round_pct > 5 THEN 'HIGH'
+        WHEN round_pct > 2 THEN 'MEDIUM'
+        ELSE 'LOW'
+    END AS risk_level
+FROM round_flagged
+WHERE round_count > 0
+ORDER BY round_pct DESC;
@@ -0,0 +1,19 @@
+-- SPLIT PURCHASE DETECTION (reads audit_emp_vendor_day)
+SELECT
+    employee_id,
+    vendor_id,
+    date::TEXT,
+    num_transactions AS fragments,
+    group_total AS real_total,
+    max_single,
+    ROUND(group_total / num_transactions, 2) AS avg_fragment,
+    CASE
+        WHEN group_total > 7000 AND num_transactions >= 4 THEN 'CRITICAL'
+        WHEN group_total > 5000 AND num_transactions >= 3 THEN 'HIGH'
+        ELSE 'MEDIUM'
+    END AS risk_level
+FROM audit_emp_vendor_day
+WHERE num_transactions > 1
+  AND group_total > 5000
+  AND max_single < 5000
+ORDER BY group_total DESC;
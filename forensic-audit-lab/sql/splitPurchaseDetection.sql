@@ -0,0 +1,32 @@
+-- SPLIT PURCHASE DETECTION
+WITH daily_groups AS (
+    SELECT
+        employee_id,
+        vendor_id,
+        date,
+        COUNT(*) AS num_transactions,
+        SUM(amount) AS group_total,
+        MAX(amount) AS max_single,
+        ROUND(AVG(amount), 2) AS avg_fragment,
+        STRING_AGG(transaction_id::TEXT, ', ') AS transaction_ids
+    FROM transactions
+    GROUP BY employee_id, vendor_id, date
+)
+SELECT
+    employee_id,
+    vendor_id,
+    date::TEXT,
+    num_transactions AS fragments,
+    group_total AS real_total,
+    max_single,
+    avg_fragment,
+    CASE
+        WHEN group_total > 7000 AND num_transactions >= 4 THEN 'CRITICAL'
+        WHEN group_total > 5000 AND num_transactions >= 3 THEN 'HIGH'
+        ELSE 'MEDIUM'
+    END AS risk_level
+FROM daily_groups
+WHERE num_transactions > 1
+  AND group_total > 5000
+  AND max_single < 5000
+ORDER BY group_total DESC;
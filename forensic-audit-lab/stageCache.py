@@ -0,0 +1,76 @@
+import os
+import pickle
+import time
+
+CACHE_DIR = 'output/.cache'
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+# =============================================================================
+# STAGE CACHE
+# =============================================================================
+# Content-addressed store for pipeline stage outputs. The caller hashes
+# whatever determines the result (generator config, seed, code version) and
+# uses the digest as the key; entries are pickles named after that digest.
+# Least recently used entries are evicted once the directory exceeds
+# max_bytes (a hit refreshes the entry's mtime).
+
+class StageCache:
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            value = pickle.load(f)
+        os.utime(path)
+        return value
+
+    def put(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temp file first so a crash never leaves a half-written entry
+        tmp_path = f'{self._path(key)}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def cached(self, key, compute):
+        """Return the cached value for key, computing and storing it on a miss."""
+        start = time.perf_counter()
+        value = self.get(key)
+        if value is not None:
+            print(f"[*] Cache hit {key[:12]} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def evict(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+# =============================================================================
+# EMPLOYEE–VENDOR GRAPH
+# =============================================================================
+# Ghost vendor signals (vendor_profile in the SQL, pair_frequency, the top-20
+# pair chart) are all properties of the bipartite employee–vendor graph.
+# Storing it as CSR matrices (rows = employees, columns = vendors) keeps every
+# metric proportional to the number of distinct pairs instead of
+# employees x vendors.
+
+def build_transaction_graph(df):
+    """Employee x vendor CSR matrices weighted by transaction count and amount."""
+    emp_codes, employees = pd.factorize(df['employee_id'], sort=True)
+    vendor_codes, vendors = pd.factorize(df['vendor_id'], sort=True)
+    shape = (len(employees), len(vendors))
+
+    # COO -> CSR sums the duplicate (employee, vendor) entries
+    counts = sparse.coo_matrix(
+        (np.ones(len(df), dtype='int64'), (emp_codes, vendor_codes)), shape=shape
+    ).tocsr()
+    amounts = sparse.coo_matrix(
+        (df['amount'].to_numpy(dtype='float64'), (emp_codes, vendor_codes)), shape=shape
+    ).tocsr()
+
+    return {
+        'employees': pd.Index(employees, name='employee_id'),
+        'vendors': pd.Index(vendors, name='vendor_id'),
+        'counts': counts,
+        'amounts': amounts,
+    }
+
+
+def herfindahl(matrix, axis):
+    """Sum of squared shares along an axis (1.0 = fully concentrated)."""
+    totals = np.asarray(matrix.sum(axis=axis)).ravel()
+    squares = np.asarray(matrix.multiply(matrix).sum(axis=axis)).ravel()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(totals > 0, squares / totals ** 2, 0.0)
+
+
+def vendor_metrics(graph):
+    """Per-vendor degree, exclusivity and Herfindahl concentration over employees."""
+    counts = graph['counts'].tocsc()
+    amounts = graph['amounts'].tocsc()
+    linked = counts.copy()
+    linked.data[:] = 1
+
+    degree = np.asarray(linked.sum(axis=0)).ravel()
+    total_tx = np.asarray(counts.sum(axis=0)).ravel()
+    top_share = np.asarray(counts.max(axis=0).todense()).ravel() / np.maximum(total_tx, 1)
+    top_employee = graph['employees'][np.asarray(counts.argmax(axis=0)).ravel()]
+
+    return pd.DataFrame({
+        'unique_employees': degree,
+        'total_transactions': total_tx,
+        'total_amount': np.asarray(amounts.sum(axis=0)).ravel().round(2),
+        'exclusivity': top_share,
+        'top_employee': top_employee,
+        'hhi_count': herfindahl(counts, axis=0),
+        'hhi_amount': herfindahl(amounts, axis=0),
+    }, index=graph['vendors'])
+
+
+def employee_metrics(graph):
+    """Per-employee vendor count and spend concentration across vendors."""
+    counts = graph['counts']
+    linked = counts.copy()
+    linked.data[:] = 1
+    return pd.DataFrame({
+        'unique_vendors': np.asarray(linked.sum(axis=1)).ravel(),
+        'total_transactions': np.asarray(counts.sum(axis=1)).ravel(),
+        'hhi_amount': herfindahl(graph['amounts'], axis=1),
+    }, index=graph['employees'])
+
+
+def shared_vendor_clusters(graph, max_vendor_degree=3):
+    """Groups of employees linked through low-degree vendors (shared ghost candidates).
+
+    Only vendors with at most max_vendor_degree employees are kept, so the
+    employee co-occurrence product B @ B.T stays as sparse as those vendors.
+    """
+    linked = graph['counts'].copy()
+    linked.data[:] = 1
+    degree = np.asarray(linked.sum(axis=0)).ravel()
+    rare_links = linked[:, np.flatnonzero(degree <= max_vendor_degree)]
+
+    shared = rare_links @ rare_links.T
+    n_clusters, labels = connected_components(shared, directed=False)
+
+    sizes = np.bincount(labels, minlength=n_clusters)
+    in_cluster = sizes[labels] > 1
+    return pd.DataFrame({
+        'employee_id': graph['employees'][in_cluster],
+        'cluster': labels[in_cluster],
+    }).sort_values(['cluster', 'employee_id'], ignore_index=True)
+
+
+def top_pairs(graph, k=20):
+    """k heaviest (employee, vendor) pairs by transaction count, from the non-zeros only."""
+    coo = graph['counts'].tocoo()
+    k = min(k, coo.nnz)
+    idx = np.argpartition(-coo.data, k - 1)[:k] if k else np.empty(0, dtype='int64')
+    idx = idx[np.lexsort((coo.row[idx], -coo.data[idx]))]
+    return pd.DataFrame({
+        'employee_id': graph['employees'][coo.row[idx]],
+        'vendor_id': graph['vendors'][coo.col[idx]],
+        'count': coo.data[idx],
+    })
+
+
+def pair_frequency(df, graph):
+    """Per-row pair count looked up in the graph (same values as the groupby merge)."""
+    rows = graph['employees'].get_indexer(df['employee_id'])
+    cols = graph['vendors'].get_indexer(df['vendor_id'])
+    return pd.Series(np.asarray(graph['counts'][rows, cols]).ravel(), index=df.index)
+
+
+def analyze_graph(df, max_vendor_degree=3):
+    """Build the graph once and compute every vendor/employee metric from it."""
+    graph = build_transaction_graph(df)
+    vendors = vendor_metrics(graph)
+    return {
+        'graph': graph,
+        'vendors': vendors,
+        'employees': employee_metrics(graph),
+        'degree_one_vendors': vendors[vendors['unique_employees'] == 1],
+        'clusters': shared_vendor_clusters(graph, max_vendor_degree),
+        'top_pairs': top_pairs(graph),
+    }
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    # The memory-mapped Arrow copy only materializes the three columns the graph needs
+    if os.path.exists('output/transactions.arrow'):
+        from forensicAuditScript import read_arrow_transactions
+        df = read_arrow_transactions(columns=['employee_id', 'vendor_id', 'amount'])
+    else:
+        df = pd.read_csv('output/transactions.csv')
+    result = analyze_graph(df)
+    graph = result['graph']
+
+    print("=" * 70)
+    print("  EMPLOYEE–VENDOR GRAPH")
+    print("=" * 70)
+    print(f"  {len(graph['employees'])} employees, {len(graph['vendors'])} vendors, "
+          f"{graph['counts'].nnz} distinct pairs")
+
+    print("\n  Degree-1 vendors (single employee):")
+    print(result['degree_one_vendors'][['top_employee', 'total_transactions', 'total_amount']]
+          .to_string())
+
+    print("\n  Most concentrated vendors (HHI by amount):")
+    print(result['vendors'].nlargest(10, 'hhi_amount')[
+        ['unique_employees', 'exclusivity', 'hhi_count', 'hhi_amount']].round(3).to_string())
+
+    print(f"\n  Shared low-degree vendor clusters: {result['clusters']['cluster'].nunique()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,9 +3,19 @@ import numpy as np
 from scipy import stats
 from datetime import datetime, timedelta
 import random
+import os
+import json
+import time
+import hashlib
+import argparse
 
-random.seed(42)
-np.random.seed(42)
+from stageCache import StageCache
+import timesheetSchema
+from timesheetSchema import ARROW_PATH, MONTH_NAMES, WEEKDAY_NAMES, apply_schema, hours_float64, write_records_arrow
+
+SEED = 42
+random.seed(SEED)
+np.random.seed(SEED)
 
 NUM_EMPLOYEES = 50
 NUM_MONTHS = 6 
@@ -146,19 +156,165 @@ def build_full_dataset(employees):
                     'is_fraud': emp['is_fraud'],
                     'fraud_type': emp['fraud_type'],
                 })
-    df = pd.DataFrame(all_records)
+    df = apply_schema(pd.DataFrame(all_records))
+    return df
+
+
+# =============================================================================
+# VECTORIZED GENERATION
+# =============================================================================
+# Same records as build_full_dataset, built column by column: the
+# employee x workday grid comes from np.repeat/np.tile, hours are drawn in one
+# truncnorm call per department as an (employees x days) matrix, and the
+# calendar columns are built directly in the timesheetSchema dtypes.
+
+
+def workday_calendar(year=2024, num_months=NUM_MONTHS):
+    """Workdays as datetime64[D] plus their weekday (0=Mon) and month index."""
+    start = np.datetime64(f'{year}-01', 'M')
+    days = np.arange(start.astype('datetime64[D]'), (start + num_months).astype('datetime64[D]'))
+    # 1970-01-01 was a Thursday (weekday 3)
+    weekday = (days.astype('int64') + 3) % 7
+    days, weekday = days[weekday < 5], weekday[weekday < 5]
+    month_index = (days.astype('datetime64[M]') - start).astype('int64')
+    return days, weekday, month_index
+
+
+def sample_hours_matrix(departments, num_days, rng):
+    """Base hours for every employee and workday, one batched draw per department."""
+    hours = np.empty((len(departments), num_days))
+    for dept, params in DEPARTMENTS.items():
+        rows = np.flatnonzero(departments == dept)
+        if not len(rows):
+            continue
+        mean_h, std_h = params['mean_hours'], params['std']
+        hours[rows] = stats.truncnorm.rvs(
+            (4 - mean_h) / std_h, (12 - mean_h) / std_h,
+            loc=mean_h, scale=std_h, size=(len(rows), num_days), random_state=rng,
+        )
+    return hours
+
+
+# =============================================================================
+# FRAUD PATTERN KERNELS
+# =============================================================================
+# Vectorized counterparts of apply_fraud_pattern. Each kernel receives the
+# hours rows of every employee with its fraud type at once (employees x days)
+# plus the weekday and month index of each column, and returns the modified
+# rows. New patterns only need a FRAUD_TYPES entry and a registered kernel.
+# Unlike the loop version, burst_padding applies its burst mask.
+
+FRAUD_KERNELS = {}
+
+
+def fraud_kernel(fraud_type):
+    def register(kernel):
+        FRAUD_KERNELS[fraud_type] = kernel
+        return kernel
+    return register
+
+
+@fraud_kernel('consistent_padding')
+def consistent_padding(hours, weekday, month_index, rng):
+    return hours + rng.uniform(1.0, 2.0, size=hours.shape)
+
+
+@fraud_kernel('friday_inflator')
+def friday_inflator(hours, weekday, month_index, rng):
+    return np.where(weekday == 4, hours + rng.uniform(2.0, 4.0, size=hours.shape), hours)
+
+
+@fraud_kernel('round_number')
+def round_number(hours, weekday, month_index, rng):
+    return rng.choice([8.0, 9.0, 10.0], size=hours.shape)
+
+
+@fraud_kernel('gradual_increase')
+def gradual_increase(hours, weekday, month_index, rng):
+    return hours + 0.5 * month_index
+
+
+@fraud_kernel('burst_padding')
+def burst_padding(hours, weekday, month_index, rng):
+    burst_mask = rng.random(hours.shape) < 0.2
+    return np.where(burst_mask, hours + rng.uniform(3.0, 5.0, size=hours.shape), hours)
+
+
+def apply_fraud_patterns(hours, fraud_codes, weekday, month_index, rng):
+    """Apply every fraud type to its employees' rows of the hours matrix in place.
+
+    fraud_codes holds each employee's position in FRAUD_TYPES (-1 = honest).
+    """
+    missing = set(FRAUD_TYPES) - set(FRAUD_KERNELS)
+    if missing:
+        raise ValueError(f"No vectorized kernel registered for: {', '.join(sorted(missing))}")
+
+    for code, fraud_type in enumerate(FRAUD_TYPES):
+        rows = fraud_codes == code
+        if rows.any():
+            modified = FRAUD_KERNELS[fraud_type](hours[rows], weekday, month_index, rng)
+            hours[rows] = np.clip(modified, 4.0, 16.0)
+    return hours
+
+
+def build_dataset_vectorized(employees, year=2024, num_months=NUM_MONTHS, seed=SEED):
+    rng = np.random.default_rng(seed)
+    days, weekday, month_index = workday_calendar(year, num_months)
+    num_emp, num_days = len(employees), len(days)
+
+    emp = pd.DataFrame(employees)
+    departments = emp['department'].to_numpy()
+    hours = sample_hours_matrix(departments, num_days, rng)
+
+    fraud_types = pd.Categorical(emp['fraud_type'], categories=list(FRAUD_TYPES))
+    apply_fraud_patterns(hours, fraud_types.codes, weekday, month_index, rng)
+
+    # Row i of the grid is employee i // num_days on day i % num_days
+    emp_codes = np.repeat(np.arange(num_emp), num_days)
+    day_codes = np.tile(np.arange(num_days), num_emp)
+    emp_ids = pd.Categorical(emp['employee_id'])
+    # calendar month (0=January), month_index keeps counting past December
+    month_codes = days.astype('datetime64[M]').astype('int64') % 12
+
+    return apply_schema(pd.DataFrame({
+        'employee_id': pd.Categorical.from_codes(emp_ids.codes[emp_codes], emp_ids.categories),
+        'department': pd.Categorical(departments, categories=list(DEPARTMENTS))[emp_codes],
+        'date': days[day_codes],
+        'day_of_week': pd.Categorical.from_codes(weekday[day_codes], WEEKDAY_NAMES, ordered=True),
+        'month': pd.Categorical.from_codes(month_codes[day_codes], MONTH_NAMES, ordered=True),
+        'hours_reported': np.round(hours, 2).ravel().astype('float32'),
+        'is_fraud': emp['is_fraud'].to_numpy()[emp_codes],
+        'fraud_type': fraud_types[emp_codes],
+    }))
+
+
+def benchmark_generation(num_employees, num_months=NUM_MONTHS):
+    employees = create_employees(num_employees)
+    start = time.perf_counter()
+    df = build_dataset_vectorized(employees, num_months=num_months)
+    seconds = time.perf_counter() - start
+    print(f"[*] Vectorized: {len(df):,} records in {seconds:.2f}s ({len(df) / seconds:,.0f} records/s)")
+
+    if num_employees * num_months <= 5000:
+        start = time.perf_counter()
+        build_full_dataset(employees)
+        loop_seconds = time.perf_counter() - start
+        print(f"[*] Loop:       {len(df):,} records in {loop_seconds:.2f}s "
+              f"({seconds and loop_seconds / seconds:.0f}x slower)")
     return df
 
 
 def add_statistical_columns(df):
-    monthly = df.groupby(['employee_id', 'month']).agg(
+    # hours are stored as float32 (timesheetSchema), the statistics are float64
+    wide = df.assign(hours_reported=hours_float64(df))
+    monthly = wide.groupby(['employee_id', 'month'], observed=True).agg(
         monthly_mean= ('hours_reported', 'mean'),
         monthly_std = ('hours_reported', 'std'),
         monthly_total = ('hours_reported', 'sum'),
         days_worked = ('hours_reported', 'count'),
     ).reset_index()
 
-    global_stats = df.groupby('employee_id').agg(
+    global_stats = wide.groupby('employee_id', observed=True).agg(
         global_mean=('hours_reported', 'mean'),
         global_std=('hours_reported', 'std'),
     ).reset_index()
@@ -166,52 +322,166 @@ def add_statistical_columns(df):
     df= df.merge(global_stats, on='employee_id')
 
     
-    df['z_score'] = (df['hours_reported'] - df['global_mean']) / df['global_std']
+    df['z_score'] = (hours_float64(df) - df['global_mean']) / df['global_std']
     
-    df['dept_percentile'] = df.groupby('department')['hours_reported'].rank(pct=True)
+    df['dept_percentile'] = df.groupby('department', observed=True)['hours_reported'].rank(pct=True)
 
     return df, monthly
 
-def export_data (df, monthly_stats, employees):
+def build_profiles(df):
+    profiles = df.assign(hours_reported=hours_float64(df)).groupby(['employee_id', 'department', 'is_fraud', 'fraud_type'], observed=True).agg(
+        avg_hours=('hours_reported', 'mean'),
+        std_hours=('hours_reported', 'std'),
+        total_hours=('hours_reported', 'sum'),
+        max_hours=('hours_reported', 'max'),
+        min_hours=('hours_reported', 'min'),
+        avg_zscore=('z_score', 'mean'),
+        days_above_z2=('z_score', lambda x: (x > 2).sum()),
+    ).reset_index()
+    return profiles
+
+
+# =============================================================================
+# STREAMING EXCEL EXPORT
+# =============================================================================
+# pd.ExcelWriter keeps the whole workbook in memory and fails past Excel's
+# 1,048,576 rows. The streaming export uses an openpyxl write-only workbook
+# (rows go straight to a temp file), writes the small aggregated sheets first
+# and splits Daily_Records into Daily_Records_1, _2, ... parts.
+
+EXCEL_MAX_ROWS = 1_048_575   # data rows per sheet, one row is the header
+EXCEL_CHUNK_ROWS = 50_000
+
+
+def write_sheet_parts(workbook, name, frame, max_rows=EXCEL_MAX_ROWS, chunk_rows=EXCEL_CHUNK_ROWS):
+    """Append frame to write-only sheets, starting a numbered part every max_rows rows."""
+    parts = max(1, -(-len(frame) // max_rows))
+    # datetime64 days go out as dates, otherwise Excel shows a 00:00:00 time part
+    date_cols = [col for col in frame.columns if pd.api.types.is_datetime64_any_dtype(frame[col])]
+    titles = []
+    for part in range(parts):
+        title = name if parts == 1 else f'{name}_{part + 1}'
+        sheet = workbook.create_sheet(title)
+        sheet.append(list(frame.columns))
+        block = frame.iloc[part * max_rows:(part + 1) * max_rows]
+        for start in range(0, len(block), chunk_rows):
+            # object dtype turns numpy scalars into Python values and NaN into empty cells
+            chunk = block.iloc[start:start + chunk_rows]
+            chunk = chunk.assign(**{col: chunk[col].dt.date for col in date_cols}).astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                sheet.append(row)
+        titles.append(title)
+    return titles
+
+
+def export_excel_streaming(path, df, monthly_stats, profiles, truth, max_rows=EXCEL_MAX_ROWS):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    titles = []
+    for name, frame in [('Monthly_Summary', monthly_stats), ('Employee_Profiles', profiles),
+                        ('Ground Truth', truth), ('Daily_Records', df)]:
+        titles += write_sheet_parts(workbook, name, frame, max_rows)
+    workbook.save(path)
+    return titles
+
+
+def export_data (df, monthly_stats, employees, streaming=None):
     import os
     os.makedirs('output', exist_ok=True)
 
     df.to_csv('output/timesheet_raw.csv', index=False)
     print (f"Exported: output/timesheet_raw.csv ({len(df)} rows)")
+
+    # Same records for the analysis scripts, memory-mapped with their dtypes intact
+    try:
+        write_records_arrow(df, ARROW_PATH)
+        print(f"Exported: {ARROW_PATH} ({len(df)} rows, Arrow IPC)")
+    except ImportError as e:
+        print(f"[!] Arrow export skipped: {e}")
+
+    profiles = build_profiles(df)
+    truth = pd.DataFrame(employees)[['employee_id', 'is_fraud', 'fraud_type']]
+    # Excel has no float32, widened as is 8.21 would show up as 8.21000003814697
+    df = df.assign(hours_reported=hours_float64(df))
+
+    # The in-memory writer cannot hold more rows than one sheet allows
+    if streaming is None:
+        streaming = len(df) > EXCEL_MAX_ROWS
+
+    if streaming:
+        start = time.perf_counter()
+        sheets = export_excel_streaming('output/timesheet_analysis.xlsx', df, monthly_stats, profiles, truth)
+        print(f"Exported: output/timesheet_analysis.xlsx ({len(sheets)} sheets, streamed in "
+              f"{time.perf_counter() - start:.1f}s)")
+        print(f"\nSheets: {', '.join(sheets)}")
+        return profiles
+
     with pd.ExcelWriter('output/timesheet_analysis.xlsx', engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Daily_Records', index=False)
+        df.assign(date=df['date'].dt.date).to_excel(writer, sheet_name='Daily_Records', index=False)
         monthly_stats.to_excel(writer, sheet_name='Monthly_Summary', index=False)
-
-        profiles = df.groupby(['employee_id', 'department', 'is_fraud', 'fraud_type']).agg(
-            avg_hours=('hours_reported', 'mean'),
-            std_hours=('hours_reported', 'std'),
-            total_hours=('hours_reported', 'sum'),
-            max_hours=('hours_reported', 'max'),
-            min_hours=('hours_reported', 'min'),
-            avg_zscore=('z_score', 'mean'),
-            days_above_z2=('z_score', lambda x: (x > 2).sum()),
-        ).reset_index()
         profiles.to_excel(writer, sheet_name='Employee_Profiles', index=False)
-
-        truth=pd.DataFrame(employees)[['employee_id', 'is_fraud', 'fraud_type']]
         truth.to_excel(writer, sheet_name="Ground Truth", index=False)
     print(f"Exported: output/timesheet_analysis.xlsx (4 sheets)")
     print(f"\nSheets: Daily_Records, Monthly_Summary, Employee_Profiles, Ground_Truth")
     
     return profiles   
 
-employees = create_employees(NUM_EMPLOYEES)
-df = build_full_dataset(employees)
-df, monthly_stats = add_statistical_columns(df)
-profiles = export_data(df, monthly_stats, employees)
-
-print(f"\n--- FINAL SUMMARY ---")
-print(f"Total records: {len(df)}")
-print(f"Employees: {df['employee_id'].nunique()}")
-print(f"Date range: {df['date'].min()} to {df['date'].max()}")
-print(f"\nEmployee Profiles (top 10 by avg z-score):")
-top_suspicious = profiles.nlargest(10, 'avg_zscore')[['employee_id','department','avg_hours','std_hours','avg_zscore','days_above_z2','is_fraud','fraud_type']]
-print(top_suspicious.to_string(index=False))
+def dataset_fingerprint():
+    """Hash of the generator config, seed, this file's code and the record schema, used as the cache key."""
+    config = {
+        'seed': SEED,
+        'num_employees': NUM_EMPLOYEES,
+        'num_months': NUM_MONTHS,
+        'departments': DEPARTMENTS,
+        'fraud_types': FRAUD_TYPES,
+    }
+    digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+    for source in (__file__, timesheetSchema.__file__):
+        with open(os.path.abspath(source), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def generate_dataset(vectorized=False):
+    employees = create_employees(NUM_EMPLOYEES)
+    df = build_dataset_vectorized(employees) if vectorized else build_full_dataset(employees)
+    df, monthly_stats = add_statistical_columns(df)
+    return {'employees': employees, 'records': df, 'monthly_stats': monthly_stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate the synthetic timesheet dataset.')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='Use the columnar generator instead of the per-record loop')
+    parser.add_argument('--streaming-excel', action='store_true',
+                        help='Write the workbook with the write-only streaming exporter (automatic past one sheet)')
+    parser.add_argument('--benchmark', type=int, metavar='EMPLOYEES',
+                        help='Time the vectorized generator for this many employees and exit')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_generation(args.benchmark)
+        return
+
+    # Same config + seed + code -> the generated frames come straight from output/.cache
+    key = dataset_fingerprint() + ('-vectorized' if args.vectorized else '')
+    dataset = StageCache().cached(key, lambda: generate_dataset(args.vectorized))
+    employees, df, monthly_stats = dataset['employees'], dataset['records'], dataset['monthly_stats']
+    profiles = export_data(df, monthly_stats, employees, streaming=args.streaming_excel or None)
+
+    print(f"\n--- FINAL SUMMARY ---")
+    print(f"Total records: {len(df)}")
+    print(f"Employees: {df['employee_id'].nunique()}")
+    print(f"Date range: {df['date'].min():%Y-%m-%d} to {df['date'].max():%Y-%m-%d}")
+    print(f"\nEmployee Profiles (top 10 by avg z-score):")
+    top_suspicious = profiles.nlargest(10, 'avg_zscore')[['employee_id','department','avg_hours','std_hours','avg_zscore','days_above_z2','is_fraud','fraud_type']]
+    print(top_suspicious.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
 
 
 # consistent padding desplaza la media hacia arriba pero mantiene
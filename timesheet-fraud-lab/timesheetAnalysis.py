@@ -1,22 +1,38 @@
+import os
+import time
+import json
+import hashlib
+import argparse
+
 import pandas as pd
 import numpy as np
-from scipy import stats
-# Visualización estadística low-code
-import seaborn as sns
-# requisito de seaborn
-import matplotlib.pyplot as plt
-# Algoritmo de clustering por similitud
-from sklearn.cluster import KMeans
-# Algoritmo de detección de anomalías, aleatoriza los datos y detecta los que se aislan rápido
-from sklearn.ensemble import IsolationForest
-# Normaliza datos para evitar sesgo a los números más altos
-from sklearn.preprocessing import StandardScaler
 
-df = pd.read_csv('output/timesheet_raw.csv')
+from stageCache import StageCache
+import timesheetSchema
+from timesheetSchema import ARROW_PATH, ARROW_SUFFIXES, hours_float64, load_records
 
+# scipy, sklearn, seaborn y matplotlib se importan dentro de cada etapa
+## importar el módulo no carga nada pesado ni ejecuta el análisis
+RAW_PATH = 'output/timesheet_raw.csv'
+CACHE_DIR = 'output/.cache/analysis'
+# columnas que usan las features y los gráficos; desde un .arrow solo se convierten estas
+LOAD_COLUMNS = ['employee_id', 'department', 'date', 'day_of_week', 'month',
+                'hours_reported', 'z_score', 'is_fraud', 'fraud_type']
 
-def build_employee_features(df):
-    features = df.groupby('employee_id').agg(
+
+def default_records_path():
+    """The generator's Arrow copy when it exists, otherwise the CSV (default --csv of every CLI)."""
+    return ARROW_PATH if os.path.exists(ARROW_PATH) else RAW_PATH
+
+
+def build_employee_features_loop(df):
+    # versión original con groupby.apply, se mantiene como referencia para el benchmark
+    from scipy import stats
+
+    # las horas vienen en float32 (timesheetSchema), se agregan en float64
+    df = df.assign(hours_reported=hours_float64(df))
+
+    features = df.groupby('employee_id', observed=True).agg(
         department = ('department', 'first'),
         avg_hours = ('hours_reported', 'mean'),
         std_hours = ('hours_reported', 'std'),
@@ -28,8 +44,8 @@ def build_employee_features(df):
 # la diferencia en escala no cambia la varianza de los viernes, es una
 ## buena medición que puede ser aplicada a todos los dias de la semana
 ### para mayor detección de outliers
-    friday_avg = df[df['day_of_week'] == 'Friday'].groupby('employee_id')['hours_reported'].mean()
-    non_friday_avg = df[df['day_of_week'] != 'Friday'].groupby('employee_id')['hours_reported'].mean()
+    friday_avg = df[df['day_of_week'] == 'Friday'].groupby('employee_id', observed=True)['hours_reported'].mean()
+    non_friday_avg = df[df['day_of_week'] != 'Friday'].groupby('employee_id', observed=True)['hours_reported'].mean()
     features['friday_ratio'] = (friday_avg / non_friday_avg).values
 
 # Normaliza la dispersión por la media. Es útil porque permite comparar el desvío
@@ -40,12 +56,14 @@ def build_employee_features(df):
 # proporción de dias donde hours % 1 == 0
 ## la posibilidad de obtener un entero en distribución continúa es bajisima
 ### que el promedio de las horas sea un entero sin decimales es manipulación
-    round_pct = df.groupby('employee_id').apply(
+    round_pct = df.groupby('employee_id', observed=True).apply(
         lambda x: (x['hours_reported'] % 1 == 0).mean()
     )
     features['round_pct'] = round_pct.values
-    month_order = {'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6}
-    df['month_num'] = df['month'].map(month_order)
+    # índice de mes continuo entre años (año*12 + mes), el mismo que usa build_employee_features
+    ## con el solo número de mes un dataset de más de 12 meses mezclaría enero de un año con el del siguiente
+    dates = pd.to_datetime(df['date'])
+    df['month_num'] = dates.dt.year * 12 + dates.dt.month
 
 # regresión lineal para ver el slope 
     def calc_slope(group):  
@@ -55,21 +73,113 @@ def build_employee_features(df):
         slope, _, _, _, _ = stats.linregress (monthly_avg.index, monthly_avg.values)
         return slope
     
-    slopes = df.groupby('employee_id').apply(calc_slope)
+    slopes = df.groupby('employee_id', observed=True).apply(calc_slope)
     features['monthly_slope'] = slopes.values
 
-    features['pct_outlier_days'] = df.groupby('employee_id').apply(
+    features['pct_outlier_days'] = df.groupby('employee_id', observed=True).apply(
         lambda x: (x['z_score'].abs() < 2).mean()
     ).values
 
-    truth = df.groupby('employee_id').agg(
+    truth = df.groupby('employee_id', observed=True).agg(
         is_fraud=('is_fraud', 'first'),
         fraud_type=('fraud_type', 'first'),
     ).reset_index()
 
     features = features.merge(truth, on='employee_id')
     return features
-features = build_employee_features(df)
+
+
+def build_employee_features(df):
+    # mismas features que build_employee_features_loop pero sin apply por empleado:
+    ## cada empleado es un código entero y todo sale de np.bincount sobre esos códigos
+    ### el costo es lineal en filas y no depende de cuántos empleados haya
+    codes, employee_ids = pd.factorize(df['employee_id'], sort=True)
+    n_emp = len(employee_ids)
+    hours = hours_float64(df).to_numpy()
+    counts = np.bincount(codes, minlength=n_emp)
+
+    # primera fila de cada empleado, equivale al 'first' del groupby
+    first_row = np.empty(n_emp, dtype='int64')
+    first_row[codes[::-1]] = np.arange(len(codes))[::-1]
+
+    avg_hours = np.bincount(codes, hours, n_emp) / counts
+    sq_dev = np.bincount(codes, (hours - avg_hours[codes]) ** 2, n_emp)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std_hours = np.sqrt(sq_dev / (counts - 1))
+    extremes = pd.Series(hours).groupby(codes).agg(['max', 'min'])
+
+    features = pd.DataFrame({
+        'employee_id': employee_ids,
+        'department': df['department'].array.take(first_row),
+        'avg_hours': avg_hours,
+        'std_hours': std_hours,
+        'max_hours': extremes['max'].to_numpy(),
+        'min_hours': extremes['min'].to_numpy(),
+        'total_hours': np.bincount(codes, hours, n_emp),
+    })
+
+# un solo pivot (empleado x es_viernes) con sumas y conteos
+## la columna 1 es el promedio de los viernes y la 0 el del resto de la semana
+    is_friday = (df['day_of_week'] == 'Friday').to_numpy()
+    pivot_key = codes * 2 + is_friday
+    friday_sums = np.bincount(pivot_key, hours, 2 * n_emp).reshape(n_emp, 2)
+    friday_counts = np.bincount(pivot_key, minlength=2 * n_emp).reshape(n_emp, 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        friday_means = friday_sums / friday_counts
+    features['friday_ratio'] = friday_means[:, 1] / friday_means[:, 0]
+
+    features['coeff_variation'] = features['std_hours'] / features['avg_hours']
+    features['round_pct'] = np.bincount(codes, hours % 1 == 0, n_emp) / counts
+
+# la pendiente de mínimos cuadrados en forma cerrada:
+## slope = (n·Σxy - Σx·Σy) / (n·Σx² - (Σx)²) sobre los promedios mensuales
+### x es el índice del mes contado desde el primer mes del dataset
+    dates = pd.to_datetime(df['date'])
+    month_index = (dates.dt.year * 12 + dates.dt.month).to_numpy()
+    month_index = month_index - month_index.min()
+    n_months = int(month_index.max()) + 1
+    month_key = codes * n_months + month_index
+    month_sums = np.bincount(month_key, hours, n_emp * n_months).reshape(n_emp, n_months)
+    month_counts = np.bincount(month_key, minlength=n_emp * n_months).reshape(n_emp, n_months)
+
+    present = month_counts > 0
+    x = np.arange(n_months, dtype='float64')
+    y = np.divide(month_sums, month_counts, out=np.zeros_like(month_sums), where=present)
+    n = present.sum(axis=1)
+    sum_x = (present * x).sum(axis=1)
+    sum_y = y.sum(axis=1)
+    sum_xy = (y * x).sum(axis=1)
+    sum_xx = (present * x ** 2).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x ** 2)
+    features['monthly_slope'] = np.where(n >= 2, slope, 0.0)
+
+    # misma semántica que la versión original: proporción de días con |z| < 2
+    inside = (df['z_score'].abs() < 2).to_numpy()
+    features['pct_outlier_days'] = np.bincount(codes, inside, n_emp) / counts
+
+    features['is_fraud'] = df['is_fraud'].array.take(first_row)
+    features['fraud_type'] = df['fraud_type'].array.take(first_row)
+    return features
+
+
+def benchmark_features(df, repeat=3):
+    """Time the loop and vectorized feature builders and check they agree."""
+    timings = {}
+    for name, builder in [('loop', build_employee_features_loop), ('vectorized', build_employee_features)]:
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = builder(df)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, result)
+
+    (loop_s, expected), (fast_s, actual) = timings['loop'], timings['vectorized']
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+    print(f"Features for {len(actual)} employees / {len(df)} rows: "
+          f"loop {loop_s:.3f}s, vectorized {fast_s:.3f}s ({loop_s / fast_s:.0f}x)")
+    return loop_s, fast_s
+
 
 # el 50% central de los datos es lo normal y cualquier valor que se aleje de ese rango
 ## mas de 1.5 es outlier
@@ -115,6 +225,11 @@ def detect_outliers_iqr(features):
 def detect_anomalies_isolation_forest(features):
 ## el algoritmo construye puntos con features al azar y va "cortando" al azar para dividir datos
 # los puntos normales están en zonas densas y no se aislan fácil, los outliers si
+    # Algoritmo de detección de anomalías, aleatoriza los datos y detecta los que se aislan rápido
+    from sklearn.ensemble import IsolationForest
+    # Normaliza datos para evitar sesgo a los números más altos
+    from sklearn.preprocessing import StandardScaler
+
     detection_cols = ['avg_hours', 'friday_ratio', 'coeff_variation',
                       'round_pct', 'monthly_slope', 'pct_outlier_days']
     
@@ -135,6 +250,10 @@ def detect_anomalies_isolation_forest(features):
 ##### y uno con todo lo demas, incluyendo burst y consistent porque 
 ##### no son lo suficientemente extremos individualmente en sus features
 def cluster_employees (features, n_clusters=4):
+    # Algoritmo de clustering por similitud
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+
     detection_cols = ['avg_hours', 'friday_ratio', 'coeff_variation',
                       'round_pct', 'monthly_slope', 'pct_outlier_days']
     scaler = StandardScaler()
@@ -145,11 +264,6 @@ def cluster_employees (features, n_clusters=4):
 
     return features
 
-    features = build_employee_features(df)
-features = detect_outliers_iqr(features)
-features = detect_anomalies_isolation_forest(features)
-features = cluster_employees(features)
-
 # IQR es explicable pero rigido / isolation forest es opaco / KMeans no rankea 
 ## se normalizan y se comparan datos
 ### IQR flags= enteros de 0 a 6 / isolation decimales de -0.16 a +0.13
@@ -172,32 +286,31 @@ def build_composite_score(features):
 
     return features
 
-features = build_employee_features(df)
-features = detect_outliers_iqr(features)
-features = detect_anomalies_isolation_forest(features)
-features = cluster_employees(features)
-features = build_composite_score(features)
-
-# --- IQR Results (fixed) ---
-print("=" * 70)
-print("IQR METHOD (threshold >= 2)")
-print("=" * 70)
-iqr_suspects = features[features['iqr_suspect']]
-print(f"Flagged: {len(iqr_suspects)} employees")
-print(f"True positives: {iqr_suspects['is_fraud'].sum()} / {features['is_fraud'].sum()}")
-print(f"False positives: {(~iqr_suspects['is_fraud']).sum()}")
-
-# --- Composite Ranking ---
-print("\n" + "=" * 70)
-print("COMPOSITE RISK SCORE - TOP 15")
-print("=" * 70)
-top15 = features.nlargest(15, 'risk_score')[
-    ['employee_id', 'department', 'risk_score', 'iqr_flags', 'iso_score', 
-     'cluster', 'is_fraud', 'fraud_type']
-]
-print(top15.to_string(index=False))
+def print_summary(features):
+    # --- IQR Results (fixed) ---
+    print("=" * 70)
+    print("IQR METHOD (threshold >= 2)")
+    print("=" * 70)
+    iqr_suspects = features[features['iqr_suspect']]
+    print(f"Flagged: {len(iqr_suspects)} employees")
+    print(f"True positives: {iqr_suspects['is_fraud'].sum()} / {features['is_fraud'].sum()}")
+    print(f"False positives: {(~iqr_suspects['is_fraud']).sum()}")
+
+    # --- Composite Ranking ---
+    print("\n" + "=" * 70)
+    print("COMPOSITE RISK SCORE - TOP 15")
+    print("=" * 70)
+    top15 = features.nlargest(15, 'risk_score')[
+        ['employee_id', 'department', 'risk_score', 'iqr_flags', 'iso_score', 
+         'cluster', 'is_fraud', 'fraud_type']
+    ]
+    print(top15.to_string(index=False))
 
 def create_visualizations(df, features):
+    # Visualización estadística low-code
+    import seaborn as sns
+    # requisito de seaborn
+    import matplotlib.pyplot as plt
 
 
     sns.set_style('whitegrid')
@@ -243,7 +356,6 @@ def create_visualizations(df, features):
     axes[1, 1].legend()
 
     plt.tight_layout()
-    import os
     os.makedirs('images', exist_ok=True)
 
     plt.savefig('images/fraud_analysis_chart.png', dpi=150, bbox_inches='tight')
@@ -268,7 +380,6 @@ def create_visualizations(df, features):
     print("Saved: images/fraud_heatmap.png")
     plt.close()
 
-create_visualizations(df, features)
 
 
 # las visualizaciones muestran:
@@ -280,4 +391,114 @@ create_visualizations(df, features)
 ## risk score: el threshold pierde los 3 fraudes con bajo score
 ### pero agrupa bien 7 fraudes
 
-## heatmap: es la visualización más rica
\ No newline at end of file
+## heatmap: es la visualización más rica
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+# Cada etapa depende solo de la anterior y se calcula una sola vez:
+## load -> features -> iqr -> iso -> cluster -> composite -> charts
+### en memoria el resultado queda en self.results; en disco se guarda con
+### StageCache, con una clave que combina el hash del CSV, el código de este
+### archivo y de timesheetSchema y el nombre de la etapa. Un .arrow no se lee
+### entero para hashearlo: se usan su tamaño y fecha de modificación. charts no se cachea porque escribe archivos.
+### load tampoco se cachea desde un .arrow: el archivo ya se lee mapeado en memoria y guardarlo en pickle solo lo copiaría.
+
+STAGES = ['load', 'features', 'iqr', 'iso', 'cluster', 'composite', 'charts']
+
+
+class TimesheetPipeline:
+
+    def __init__(self, csv_path=RAW_PATH, cache_dir=CACHE_DIR, use_disk_cache=True):
+        self.csv_path = csv_path
+        self.cache = StageCache(cache_dir) if use_disk_cache else None
+        self.results = {}
+        self.timings = {}
+        self._fingerprint = None
+
+    def fingerprint(self):
+        """Hash of the input file, this file's code and the record schema; changes invalidate every cached stage."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            if self.csv_path.endswith(ARROW_SUFFIXES):
+                stat = os.stat(self.csv_path)
+                digest.update(f"{os.path.abspath(self.csv_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+            else:
+                with open(self.csv_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            for source in (__file__, timesheetSchema.__file__):
+                with open(os.path.abspath(source), 'rb') as f:
+                    digest.update(f.read())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _compute(self, stage):
+        if stage == 'load':
+            return load_records(self.csv_path, LOAD_COLUMNS)
+        if stage == 'features':
+            return build_employee_features(self.run('load'))
+        # cada etapa trabaja sobre una copia para no modificar el resultado memoizado de la anterior
+        if stage == 'iqr':
+            return detect_outliers_iqr(self.run('features').copy())
+        if stage == 'iso':
+            return detect_anomalies_isolation_forest(self.run('iqr').copy())
+        if stage == 'cluster':
+            return cluster_employees(self.run('iso').copy())
+        if stage == 'composite':
+            return build_composite_score(self.run('cluster').copy())
+        if stage == 'charts':
+            return create_visualizations(self.run('load'), self.run('composite'))
+        raise ValueError(f"Unknown stage '{stage}', expected one of: {', '.join(STAGES)}")
+
+    def run(self, stage):
+        """Result of a stage, computing its dependencies at most once."""
+        if stage in self.results:
+            return self.results[stage]
+
+        cacheable = (self.cache is not None and stage != 'charts'
+                     and not (stage == 'load' and self.csv_path.endswith(ARROW_SUFFIXES)))
+        key = hashlib.sha256(f"{self.fingerprint()}:{stage}".encode()).hexdigest() if cacheable else None
+        start = time.perf_counter()
+        result = self.cache.get(key) if cacheable else None
+        if result is None:
+            result = self._compute(stage)
+            if cacheable:
+                self.cache.put(key, result)
+        # el tiempo de una etapa incluye el de las dependencias que tuvo que calcular
+        self.timings.setdefault(stage, round(time.perf_counter() - start, 3))
+        self.results[stage] = result
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Timesheet fraud analysis pipeline.')
+    parser.add_argument('stages', nargs='*', default=STAGES,
+                        help=f"Stages to run (default: all). Choices: {', '.join(STAGES)}")
+    parser.add_argument('--csv', default=default_records_path(),
+                        help='Records as CSV or Arrow IPC (.arrow / .feather)')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute every stage instead of reading output/.cache')
+    parser.add_argument('--benchmark-features', action='store_true',
+                        help='Compare the loop and vectorized feature builders and exit')
+    args = parser.parse_args()
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))}")
+
+    pipeline = TimesheetPipeline(args.csv, use_disk_cache=not args.no_cache)
+    if args.benchmark_features:
+        benchmark_features(pipeline.run('load'))
+        return
+
+    for stage in args.stages:
+        pipeline.run(stage)
+    if 'composite' in pipeline.results:
+        print_summary(pipeline.results['composite'])
+
+    print(f"\nStage timings: {json.dumps(pipeline.timings)}")
+
+
+if __name__ == "__main__":
+    main()
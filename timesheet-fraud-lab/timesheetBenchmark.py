@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import argparse
+import resource
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+import timeSheetFraudLab as lab
+import timesheetAnalysis as analysis
+from timesheetSchema import hours_float64, load_records, write_records_arrow
+
+RESULTS_PATH = 'output/benchmark_results.json'
+SIZES = [1_000, 10_000, 100_000]
+REGRESSION_RATIO = 1.5     # a stage fails when it is this many times slower than the baseline
+MIN_SECONDS = 0.05         # ignore stages faster than this in both runs (timer noise)
+EXCEL_MAX_ROWS = 1_500_000
+CHART_MAX_EMPLOYEES = 2_000
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+# Each stage runs inside measure(), which records wall time and the peak
+# resident set size seen while it ran. ru_maxrss only ever grows for the
+# whole process, so a background thread samples /proc/self/statm instead
+# (falling back to ru_maxrss where /proc is not available).
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+@contextmanager
+def measure(stages, name, interval=0.01):
+    peak = [current_rss()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        done.set()
+        sampler.join()
+        peak[0] = max(peak[0], current_rss())
+        stages[name] = {'seconds': round(seconds, 4), 'peak_rss_mb': round(peak[0] / 2 ** 20, 1)}
+        print(f"    {name:<20} {seconds:>9.3f}s  {stages[name]['peak_rss_mb']:>9.1f} MB")
+
+
+def warm_up():
+    """Import the lazily loaded libraries up front so no stage pays for an import."""
+    import openpyxl
+    import pyarrow
+    import matplotlib.pyplot
+    import seaborn
+    import sklearn.cluster
+    import sklearn.ensemble
+    import sklearn.preprocessing
+
+
+def run_size(num_employees, num_months, fraud_ratio, workdir,
+             excel_max_rows=EXCEL_MAX_ROWS, chart_max_employees=CHART_MAX_EMPLOYEES):
+    """Time every pipeline stage for one population size."""
+    stages = {}
+    print(f"[*] {num_employees:,} employees x {num_months} months (fraud ratio {fraud_ratio})")
+
+    with measure(stages, 'generation'):
+        employees = lab.create_employees(num_employees, fraud_ratio)
+        df = lab.build_dataset_vectorized(employees, num_months=num_months)
+    with measure(stages, 'statistical_columns'):
+        df, monthly_stats = lab.add_statistical_columns(df)
+    with measure(stages, 'csv_export'):
+        df.to_csv(os.path.join(workdir, 'timesheet_raw.csv'), index=False)
+    with measure(stages, 'arrow_export'):
+        write_records_arrow(df, os.path.join(workdir, 'timesheet_raw.arrow'))
+    with measure(stages, 'arrow_load'):
+        load_records(os.path.join(workdir, 'timesheet_raw.arrow'), analysis.LOAD_COLUMNS)
+
+    if len(df) <= excel_max_rows:
+        with measure(stages, 'excel_export'):
+            truth = pd.DataFrame(employees)[['employee_id', 'is_fraud', 'fraud_type']]
+            profiles = lab.build_profiles(df)
+            # same widening as export_data: Excel has no float32
+            lab.export_excel_streaming(os.path.join(workdir, 'timesheet_analysis.xlsx'),
+                                       df.assign(hours_reported=hours_float64(df)), monthly_stats, profiles, truth)
+    else:
+        stages['excel_export'] = {'skipped': f'{len(df):,} rows > --excel-max-rows'}
+
+    with measure(stages, 'features'):
+        features = analysis.build_employee_features(df)
+    with measure(stages, 'iqr'):
+        features = analysis.detect_outliers_iqr(features)
+    with measure(stages, 'isolation_forest'):
+        features = analysis.detect_anomalies_isolation_forest(features)
+    with measure(stages, 'kmeans'):
+        features = analysis.cluster_employees(features)
+    features = analysis.build_composite_score(features)
+
+    if num_employees <= chart_max_employees:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            with measure(stages, 'charts'):
+                analysis.create_visualizations(df, features)
+        finally:
+            os.chdir(cwd)
+    else:
+        stages['charts'] = {'skipped': f'{num_employees:,} employees > --chart-max-employees'}
+
+    return {
+        'employees': num_employees,
+        'months': num_months,
+        'fraud_ratio': fraud_ratio,
+        'rows': len(df),
+        'stages': stages,
+    }
+
+
+# =============================================================================
+# BASELINE COMPARISON
+# =============================================================================
+
+def find_regressions(results, baseline, ratio=REGRESSION_RATIO, min_seconds=MIN_SECONDS):
+    """Stages slower than ratio x the baseline run with the same parameters."""
+    def key(run):
+        return run['employees'], run['months'], run['fraud_ratio']
+
+    previous = {key(run): run for run in baseline['runs']}
+    regressions = []
+    for run in results['runs']:
+        base = previous.get(key(run))
+        if base is None:
+            continue
+        for stage, timing in run['stages'].items():
+            before = base['stages'].get(stage, {}).get('seconds')
+            after = timing.get('seconds')
+            if before is None or after is None or max(before, after) < min_seconds:
+                continue
+            if after > before * ratio:
+                regressions.append({'employees': run['employees'], 'stage': stage,
+                                    'baseline': before, 'current': after,
+                                    'ratio': round(after / max(before, 1e-9), 2)})
+    return regressions
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling benchmark for timesheet generation and analysis.')
+    parser.add_argument('--employees', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--months', type=int, default=lab.NUM_MONTHS)
+    parser.add_argument('--fraud-ratio', type=float, default=0.2)
+    parser.add_argument('--out', default=RESULTS_PATH)
+    parser.add_argument('--baseline', help='Fail when a stage regresses against this results file')
+    parser.add_argument('--ratio', type=float, default=REGRESSION_RATIO)
+    parser.add_argument('--excel-max-rows', type=int, default=EXCEL_MAX_ROWS)
+    parser.add_argument('--chart-max-employees', type=int, default=CHART_MAX_EMPLOYEES)
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'runs': [],
+    }
+    warm_up()
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_employees in args.employees:
+            results['runs'].append(run_size(num_employees, args.months, args.fraud_ratio, workdir,
+                                            args.excel_max_rows, args.chart_max_employees))
+
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"[+] Saved {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.ratio)
+        for r in regressions:
+            print(f"[!] {r['stage']} at {r['employees']:,} employees: "
+                  f"{r['baseline']:.3f}s -> {r['current']:.3f}s ({r['ratio']}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"[+] No stage slower than {args.ratio}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
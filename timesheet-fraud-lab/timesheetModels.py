@@ -0,0 +1,314 @@
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from timesheetAnalysis import TimesheetPipeline, default_records_path
+
+MODEL_DIR = 'output/models'
+MODEL_PATH = os.path.join(MODEL_DIR, 'timesheet_models.joblib')
+SCORES_PATH = os.path.join(MODEL_DIR, 'scores.pkl')
+MODEL_VERSION = 1
+
+DETECTION_COLS = ['avg_hours', 'friday_ratio', 'coeff_variation',
+                  'round_pct', 'monthly_slope', 'pct_outlier_days']
+
+REFIT_DAYS = 30
+DRIFT_PSI = 0.2
+PSI_BINS = 10
+MIN_PSI_ROWS = 5 * PSI_BINS
+RETAIN_DAYS = 90
+CV_FOLDS = 5
+
+
+# =============================================================================
+# MODEL BUNDLE
+# =============================================================================
+# Everything needed to score an employee without refitting: the fitted
+# scaler, IsolationForest and KMeans, plus the training-set constants the
+# composite score depends on (IQR bounds, iso_score range, cluster fraud
+# rates) and per-feature decile bins for drift checks. The bundle carries the
+# feature schema and MODEL_VERSION so a stale file is rejected on load.
+# Cluster fraud rates need is_fraud labels; unlabeled rows are left out of
+# them, and with no labels at all cluster_risk is None and score_features
+# spreads its weight over the IQR and IsolationForest terms.
+
+def fit_models(features, contamination=0.2, n_clusters=4, random_state=42):
+    from sklearn.cluster import KMeans
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    X = features[DETECTION_COLS].to_numpy(dtype='float64')
+    scaler = StandardScaler().fit(X)
+    X_scaled = scaler.transform(X)
+    forest = IsolationForest(contamination=contamination, random_state=random_state).fit(X_scaled)
+    kmeans = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10).fit(X_scaled)
+
+    q1, median, q3 = np.quantile(X, [0.25, 0.5, 0.75], axis=0)
+    bundle = {
+        'version': MODEL_VERSION,
+        'schema': {'columns': DETECTION_COLS},
+        'params': {'contamination': contamination, 'n_clusters': n_clusters, 'random_state': random_state},
+        'fitted_at': time.time(),
+        'n_train': len(X),
+        'scaler': scaler,
+        'forest': forest,
+        'kmeans': kmeans,
+        'iqr': {'q1': q1, 'median': median, 'q3': q3},
+        'bin_edges': np.quantile(X, np.linspace(0, 1, PSI_BINS + 1), axis=0).T,
+    }
+    bundle['bin_shares'] = np.array([bin_shares(X[:, j], bundle['bin_edges'][j]) for j in range(X.shape[1])])
+
+    iso_score = forest.decision_function(X_scaled)
+    bundle['iso_range'] = (float(iso_score.min()), float(iso_score.max()))
+    bundle['iqr_max'] = int(iqr_flags(bundle, X).max())
+    bundle['cluster_risk'] = None
+    if 'is_fraud' in features.columns and features['is_fraud'].notna().any():
+        bundle['cluster_risk'] = (pd.Series(features['is_fraud'].to_numpy(dtype='float64'))
+                                  .groupby(kmeans.labels_).mean().dropna().to_dict())
+    return bundle
+
+
+def save_models(bundle, path=MODEL_PATH):
+    import joblib
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    joblib.dump(bundle, path)
+
+
+def load_models(path=MODEL_PATH):
+    import joblib
+
+    bundle = joblib.load(path)
+    if bundle.get('version') != MODEL_VERSION or bundle['schema']['columns'] != DETECTION_COLS:
+        raise ValueError(f"{path} was saved with version {bundle.get('version')} / "
+                         f"columns {bundle['schema']['columns']}; expected {MODEL_VERSION} / {DETECTION_COLS}")
+    return bundle
+
+
+# =============================================================================
+# SCORING
+# =============================================================================
+
+def iqr_flags(bundle, X):
+    """Same rule as detect_outliers_iqr, with the quartiles frozen at fit time."""
+    q1, median, q3 = bundle['iqr']['q1'], bundle['iqr']['median'], bundle['iqr']['q3']
+    iqr = q3 - q1
+    outside = (X < q1 - 1.5 * iqr) | (X > q3 + 1.5 * iqr)
+    return np.where(iqr == 0, X != median, outside).sum(axis=1)
+
+
+def out_of_fold_cluster_risk(clusters, is_fraud, folds=CV_FOLDS, random_state=42):
+    """Each employee's cluster fraud rate, measured on the other folds only."""
+    clusters = np.asarray(clusters)
+    is_fraud = np.asarray(is_fraud, dtype='float64')
+    fold = np.random.default_rng(random_state).permutation(len(clusters)) % folds
+    risk = np.zeros(len(clusters))
+    for f in range(folds):
+        held = fold == f
+        rates = pd.Series(is_fraud[~held]).groupby(clusters[~held]).mean()
+        risk[held] = pd.Series(clusters[held]).map(rates).fillna(0).to_numpy()
+    return risk
+
+
+def score_features(bundle, features, out_of_fold=False):
+    """Composite risk_score for feature rows using the persisted models only."""
+    missing = set(DETECTION_COLS) - set(features.columns)
+    if missing:
+        raise ValueError(f"Feature rows are missing columns: {', '.join(sorted(missing))}")
+
+    X = features[DETECTION_COLS].to_numpy(dtype='float64')
+    X_scaled = bundle['scaler'].transform(X)
+    iso_score = bundle['forest'].decision_function(X_scaled)
+    cluster = bundle['kmeans'].predict(X_scaled)
+    flags = iqr_flags(bundle, X)
+
+    iso_min, iso_max = bundle['iso_range']
+    # a tiny training set can give every row the same iso_score
+    iso_norm = (np.clip(1 - (iso_score - iso_min) / (iso_max - iso_min), 0, 1)
+                if iso_max > iso_min else np.zeros(len(X)))
+    iqr_score = flags / bundle['iqr_max'] if bundle['iqr_max'] else np.zeros(len(X))
+    # bundle['cluster_risk'] comes from the training labels; when the scores are
+    # evaluated against those same labels no employee may see its own label
+    if out_of_fold:
+        if 'is_fraud' not in features.columns:
+            raise ValueError('out_of_fold scoring needs an is_fraud column')
+        cluster_risk = out_of_fold_cluster_risk(cluster, features['is_fraud'])
+    elif bundle['cluster_risk'] is not None:
+        cluster_risk = pd.Series(cluster).map(bundle['cluster_risk']).fillna(0).to_numpy()
+    else:
+        cluster_risk = None
+
+    if cluster_risk is None:
+        # fitted without labels: same total weight (1.05), split between the other two terms
+        risk_score = (0.35 * iqr_score + 0.45 * iso_norm) * (1.05 / 0.80)
+    else:
+        risk_score = 0.35 * iqr_score + 0.45 * iso_norm + 0.25 * cluster_risk
+
+    return pd.DataFrame({
+        'employee_id': features['employee_id'].to_numpy(),
+        'iqr_flags': flags,
+        'iqr_suspect': flags >= 2,
+        'iso_score': iso_score,
+        'iso_suspect': bundle['forest'].predict(X_scaled) == -1,
+        'cluster': cluster,
+        'risk_score': risk_score,
+    })
+
+
+# =============================================================================
+# REFIT POLICY
+# =============================================================================
+# A saved bundle is reused until it is older than refit_days or the feature
+# distribution drifts: the Population Stability Index of any feature against
+# its training deciles above drift_threshold (0.2 is the usual "significant
+# shift" cut-off) triggers a refit. Below MIN_PSI_ROWS rows the decile shares
+# are mostly sampling noise, so drift is not measured at all.
+
+def bin_shares(values, edges):
+    inner = edges[1:-1]
+    counts = np.bincount(np.searchsorted(inner, values, side='right'), minlength=len(edges) - 1)
+    return counts / max(len(values), 1)
+
+
+def feature_drift(bundle, features):
+    """PSI per feature of the new rows against the training distribution."""
+    X = features[DETECTION_COLS].to_numpy(dtype='float64')
+    eps = 1e-4
+    psi = {}
+    for j, col in enumerate(DETECTION_COLS):
+        expected = np.maximum(bundle['bin_shares'][j], eps)
+        actual = np.maximum(bin_shares(X[:, j], bundle['bin_edges'][j]), eps)
+        psi[col] = float(((actual - expected) * np.log(actual / expected)).sum())
+    return psi
+
+
+def refit_reason(bundle, features, refit_days=REFIT_DAYS, drift_threshold=DRIFT_PSI):
+    """Why the models should be refit, or None to keep the saved ones."""
+    age_days = (time.time() - bundle['fitted_at']) / 86400
+    if age_days > refit_days:
+        return f"models are {age_days:.0f} days old (schedule: {refit_days})"
+    if len(features) < MIN_PSI_ROWS:
+        return None
+    drifted = {col: psi for col, psi in feature_drift(bundle, features).items() if psi > drift_threshold}
+    if drifted:
+        return 'drift in ' + ', '.join(f"{col} (PSI {psi:.2f})" for col, psi in drifted.items())
+    return None
+
+
+# =============================================================================
+# INCREMENTAL SCORING
+# =============================================================================
+# scores.pkl keeps, per employee, the scores, the feature row they came from
+# (with a hash of it) and when that row was last seen. A new period may pass
+# every employee or only the ones with new activity: its rows replace the
+# stored ones, and the merged population is what drift is measured on and
+# what a refit trains on. Employees not seen for retain_days are dropped.
+# Without a refit only new or changed rows are scored; after a refit the
+# whole population is rescored so every stored score comes from the same
+# models.
+
+SCORE_COLS = ['employee_id', 'iqr_flags', 'iqr_suspect', 'iso_score', 'iso_suspect', 'cluster', 'risk_score']
+
+
+def feature_hashes(features):
+    return pd.util.hash_pandas_object(features[DETECTION_COLS], index=False).to_numpy()
+
+
+def load_scores(scores_path=SCORES_PATH, retain_days=RETAIN_DAYS, now=None):
+    """Stored scores still inside the retention window, and how many aged out."""
+    if not os.path.exists(scores_path):
+        return None, 0
+    stored = pd.read_pickle(scores_path)
+    # files from before the feature rows were stored cannot seed a population
+    if not {'feature_hash', 'last_seen', *DETECTION_COLS} <= set(stored.columns):
+        return None, 0
+    now = time.time() if now is None else now
+    fresh = stored['last_seen'] >= now - retain_days * 86400
+    return stored[fresh].reset_index(drop=True), int((~fresh).sum())
+
+
+def score_new_period(features, model_path=MODEL_PATH, scores_path=SCORES_PATH,
+                     refit_days=REFIT_DAYS, drift_threshold=DRIFT_PSI, force_refit=False,
+                     retain_days=RETAIN_DAYS):
+    start = time.perf_counter()
+    now = time.time()
+    previous, aged_out = load_scores(scores_path, retain_days, now)
+
+    feature_cols = ['employee_id', *DETECTION_COLS] + (['is_fraud'] if 'is_fraud' in features.columns else [])
+    current = features[feature_cols].assign(feature_hash=feature_hashes(features), last_seen=now)
+    population = current
+    if previous is not None:
+        untouched = previous[~previous['employee_id'].isin(current['employee_id'])]
+        population = pd.concat([untouched, current], ignore_index=True)
+
+    bundle, reason = None, 'forced' if force_refit else None
+    if not force_refit:
+        if os.path.exists(model_path):
+            bundle = load_models(model_path)
+            reason = refit_reason(bundle, population, refit_days, drift_threshold)
+        else:
+            reason = 'no saved models'
+
+    todo = np.ones(len(population), dtype=bool)
+    if reason:
+        bundle = fit_models(population)
+        save_models(bundle, model_path)
+    elif previous is not None:
+        known = pd.Series(previous['feature_hash'].to_numpy(), index=previous['employee_id'])
+        todo = known.reindex(population['employee_id']).to_numpy() != population['feature_hash'].to_numpy()
+
+    scored = population
+    if todo.any():
+        rows = population[todo].drop(columns=SCORE_COLS[1:], errors='ignore').reset_index(drop=True)
+        fresh = score_features(bundle, rows).drop(columns='employee_id')
+        scored = rows.join(fresh)
+        if not todo.all():
+            # current rows joined the population without scores, which widened the dtypes
+            scored = pd.concat([population[~todo], scored], ignore_index=True).astype(fresh.dtypes.to_dict())
+    scored = scored.sort_values('risk_score', ascending=False, ignore_index=True)
+
+    os.makedirs(os.path.dirname(scores_path), exist_ok=True)
+    scored.to_pickle(scores_path)
+    return scored, {
+        'refit': reason,
+        'population': len(population),
+        'scored_rows': int(todo.sum()),
+        'reused_rows': int(len(todo) - todo.sum()),
+        'aged_out': aged_out,
+        'seconds': round(time.perf_counter() - start, 4),
+    }
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Score employees with the persisted timesheet models.')
+    parser.add_argument('--csv', default=default_records_path())
+    parser.add_argument('--refit', action='store_true', help='Refit and overwrite the saved models')
+    parser.add_argument('--refit-days', type=float, default=REFIT_DAYS)
+    parser.add_argument('--drift', type=float, default=DRIFT_PSI, help='PSI above which the models are refit')
+    parser.add_argument('--retain-days', type=float, default=RETAIN_DAYS,
+                        help='Drop stored employees not seen for this many days')
+    args = parser.parse_args()
+
+    features = TimesheetPipeline(args.csv).run('features')
+    scores, info = score_new_period(features, refit_days=args.refit_days,
+                                    drift_threshold=args.drift, force_refit=args.refit,
+                                    retain_days=args.retain_days)
+
+    print("=" * 70)
+    print("PERSISTED MODEL SCORING")
+    print("=" * 70)
+    print(f"Refit: {info['refit'] or 'no (saved models reused)'}")
+    print(f"Scored {info['scored_rows']} employees, reused {info['reused_rows']}, "
+          f"aged out {info['aged_out']} in {info['seconds'] * 1000:.1f} ms")
+    print(scores.head(15)[SCORE_COLS].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
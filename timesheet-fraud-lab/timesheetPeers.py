@@ -0,0 +1,108 @@
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from timesheetAnalysis import TimesheetPipeline, default_records_path
+
+PEER_K = 10
+# Peers are matched on the shape of their hours, which padding does not move...
+PROFILE_COLS = ['std_hours', 'friday_ratio', 'round_pct', 'monthly_slope']
+# ...and compared on the level, which it does
+DEVIATION_COLS = ['avg_hours', 'total_hours', 'max_hours']
+PEER_Z_ALERT = 3.0
+MAD_SCALE = 1.4826
+
+
+# =============================================================================
+# PEER GROUPS
+# =============================================================================
+# consistent_padding shifts an employee's whole distribution, so the
+# per-employee z-score cannot see it; it only shows against similar
+# colleagues. Within each department a KD-tree over the standardized
+# profile finds every employee's k nearest peers in O(n log n), and each
+# DEVIATION_COLS value is compared with the peers' median and MAD (robust to
+# a fraudulent peer in the group).
+
+def peer_deviation(features, k=PEER_K, group_col='department', profile_cols=PROFILE_COLS,
+                   deviation_cols=DEVIATION_COLS, algorithm='kd_tree'):
+    from sklearn.neighbors import NearestNeighbors
+    from sklearn.preprocessing import StandardScaler
+
+    result = pd.DataFrame(index=features.index)
+    for col in deviation_cols:
+        result[f'peer_median_{col}'] = np.nan
+        result[f'peer_z_{col}'] = np.nan
+
+    for _, group in features.groupby(group_col, observed=True, sort=False):
+        n_peers = min(k, len(group) - 1)
+        if n_peers < 2:
+            continue
+        profile = StandardScaler().fit_transform(group[profile_cols].to_numpy(dtype='float64'))
+        index = NearestNeighbors(n_neighbors=n_peers + 1, algorithm=algorithm).fit(profile)
+        # Column 0 is the employee itself
+        neighbors = index.kneighbors(profile, return_distance=False)[:, 1:]
+
+        for col in deviation_cols:
+            values = group[col].to_numpy(dtype='float64')
+            peers = values[neighbors]
+            median = np.median(peers, axis=1)
+            spread = MAD_SCALE * np.median(np.abs(peers - median[:, None]), axis=1)
+            spread = np.maximum(spread, 1e-9)
+            result.loc[group.index, f'peer_median_{col}'] = median
+            result.loc[group.index, f'peer_z_{col}'] = (values - median) / spread
+
+    z_cols = [f'peer_z_{col}' for col in deviation_cols]
+    result['peer_score'] = result[z_cols].abs().max(axis=1)
+    result['peer_suspect'] = result[f'peer_z_{deviation_cols[0]}'] > PEER_Z_ALERT
+    return result
+
+
+def add_peer_features(features, **kwargs):
+    return pd.concat([features, peer_deviation(features, **kwargs)], axis=1)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare every employee with their k nearest peers.')
+    parser.add_argument('--csv', default=default_records_path())
+    parser.add_argument('--employees', type=int, help='Generate a synthetic population of this size instead')
+    parser.add_argument('--k', type=int, default=PEER_K)
+    parser.add_argument('--by', default='department')
+    args = parser.parse_args()
+
+    if args.employees:
+        from timesheetSegments import synthetic_features
+        features = synthetic_features(args.employees)
+    else:
+        features = TimesheetPipeline(args.csv).run('features')
+
+    start = time.perf_counter()
+    peers = add_peer_features(features, k=args.k, group_col=args.by)
+    seconds = time.perf_counter() - start
+
+    print("=" * 70)
+    print(f"PEER COMPARISON (k={args.k}, grouped by {args.by})")
+    print("=" * 70)
+    print(f"{len(peers)} employees in {seconds:.2f}s")
+
+    flagged = peers[peers['peer_suspect']]
+    print(f"Flagged (peer z of avg_hours > {PEER_Z_ALERT}): {len(flagged)} employees, "
+          f"{flagged['is_fraud'].sum()} fraudulent")
+    by_type = peers.groupby(peers['fraud_type'].astype(object).fillna('none'))['peer_suspect'].mean()
+    print("\nShare flagged by fraud type:")
+    print(by_type.round(3).to_string())
+
+    print("\nTop 15 by peer z of avg_hours:")
+    print(peers.nlargest(15, 'peer_z_avg_hours')[
+        ['employee_id', args.by, 'avg_hours', 'peer_median_avg_hours', 'peer_z_avg_hours',
+         'is_fraud', 'fraud_type']
+    ].round(3).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import time
+import argparse
+
+import pandas as pd
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+
+# =============================================================================
+# RECORD SCHEMA
+# =============================================================================
+# One row per employee and workday. Repeated strings become categoricals
+# (each row stores a small integer code: int8 up to 127 employees, int16 /
+# int32 beyond), dates are datetime64 and hours float32, which is plenty
+# for values with two decimals. Weekday and month have fixed, ordered
+# categories, so month codes are the month number minus one and sorting is
+# chronological. Group by these columns with observed=True, and aggregate
+# hours through hours_float64 so float32 rounding never reaches a statistic.
+
+HOURS_DECIMALS = 2
+ARROW_PATH = 'output/timesheet_raw.arrow'
+ARROW_SUFFIXES = ('.arrow', '.feather')
+
+RECORD_SCHEMA = {
+    'employee_id': 'category',
+    'department': 'category',
+    'date': 'datetime64[s]',
+    'day_of_week': pd.CategoricalDtype(WEEKDAY_NAMES, ordered=True),
+    'month': pd.CategoricalDtype(MONTH_NAMES, ordered=True),
+    'hours_reported': 'float32',
+    'is_fraud': 'bool',
+    'fraud_type': 'category',
+}
+
+
+def apply_schema(df, schema=RECORD_SCHEMA):
+    """Cast the schema columns present in df; columns already in the right dtype are left alone."""
+    casts = {}
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        current = df[col].dtype
+        # plain 'category' keeps whatever categories the caller already chose
+        if dtype == 'category' and isinstance(current, pd.CategoricalDtype):
+            continue
+        if current == dtype:
+            continue
+        casts[col] = dtype
+    if not casts:
+        return df
+
+    df = df.copy()
+    for col, dtype in casts.items():
+        if str(dtype).startswith('datetime64') and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col]).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def hours_float64(df):
+    """hours_reported widened to float64 and rounded back to HOURS_DECIMALS."""
+    return df['hours_reported'].astype('float64').round(HOURS_DECIMALS)
+
+
+def read_records(path, columns=None):
+    """Read a timesheet CSV straight into RECORD_SCHEMA."""
+    dtypes = {col: dtype for col, dtype in RECORD_SCHEMA.items() if col != 'date'}
+    usecols = None if columns is None else (lambda col: col in columns)
+    parse_dates = ['date'] if columns is None or 'date' in columns else None
+    return apply_schema(pd.read_csv(path, usecols=usecols, dtype=dtypes, parse_dates=parse_dates))
+
+
+# =============================================================================
+# ARROW IPC
+# =============================================================================
+# The generator also publishes the records as an uncompressed Arrow IPC
+# (Feather v2) file. Categoricals are stored as dictionaries and the pandas
+# metadata travels in the schema, so the frame comes back with the same
+# dtypes. Reading memory-maps the file and only converts the selected
+# columns: load time follows the columns touched, not the file size.
+
+def write_records_arrow(df, path=ARROW_PATH):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(apply_schema(df), preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return table.schema
+
+
+def read_records_arrow(path=ARROW_PATH, columns=None):
+    """Memory-mapped read of an Arrow IPC file, converting only the requested columns."""
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select([col for col in columns if col in table.column_names])
+        df = table.to_pandas()
+    return apply_schema(df)
+
+
+def load_records(path, columns=None):
+    """Records from an Arrow IPC (.arrow / .feather) file or a CSV, in RECORD_SCHEMA."""
+    if path.endswith(ARROW_SUFFIXES):
+        return read_records_arrow(path, columns)
+    return read_records(path, columns)
+
+
+def to_plain(df):
+    """The same frame with object-dtype strings and float64 hours, as the loop generator used to build it."""
+    plain = df.copy()
+    for col in plain.columns:
+        if isinstance(plain[col].dtype, pd.CategoricalDtype):
+            plain[col] = plain[col].astype(object)
+    if 'date' in plain.columns:
+        plain['date'] = plain['date'].dt.strftime('%Y-%m-%d')
+    if 'hours_reported' in plain.columns:
+        plain['hours_reported'] = plain['hours_reported'].astype('float64')
+    return plain
+
+
+# =============================================================================
+# COMPARISON
+# =============================================================================
+
+def compare_schema(df, repeat=3):
+    """Memory and grouped aggregation time of the typed frame against its plain version."""
+    frames = {'plain': to_plain(df), 'typed': apply_schema(df)}
+    report = {}
+    for name, frame in frames.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            frame.groupby(['employee_id', 'month'], observed=True)['hours_reported'].agg(['mean', 'std', 'sum'])
+            frame.groupby(['department', 'day_of_week'], observed=True)['hours_reported'].mean()
+            best = min(best, time.perf_counter() - start)
+        report[name] = {
+            'memory_mb': frame.memory_usage(deep=True).sum() / 2 ** 20,
+            'groupby_seconds': best,
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory and groupby cost of the typed record schema.')
+    parser.add_argument('--employees', type=int, default=10_000)
+    args = parser.parse_args()
+
+    import timeSheetFraudLab as lab
+
+    records = lab.build_dataset_vectorized(lab.create_employees(args.employees))
+    report = compare_schema(records)
+    plain, typed = report['plain'], report['typed']
+
+    print("=" * 70)
+    print(f"RECORD SCHEMA ({len(records):,} records, {args.employees:,} employees)")
+    print("=" * 70)
+    print(f"{'':<8}{'memory':>12}{'groupby':>12}")
+    for name, row in report.items():
+        print(f"{name:<8}{row['memory_mb']:>10.1f}MB{row['groupby_seconds']:>11.3f}s")
+    print(f"\nMemory {plain['memory_mb'] / typed['memory_mb']:.1f}x smaller, "
+          f"groupby {plain['groupby_seconds'] / typed['groupby_seconds']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
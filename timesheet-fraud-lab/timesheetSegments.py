@@ -0,0 +1,182 @@
+import os
+import time
+import argparse
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from timesheetAnalysis import TimesheetPipeline, build_employee_features, default_records_path
+from timesheetModels import DETECTION_COLS, fit_models, score_features
+
+MIN_SEGMENT_SIZE = 5
+
+
+# =============================================================================
+# SEGMENTED MODELS
+# =============================================================================
+# One scaler + IsolationForest + KMeans per department (or any grouping
+# column) instead of one global model: hours profiles differ by department,
+# and independent segments fit in parallel. Feature rows are sorted by
+# segment and copied once into shared memory, so each worker only receives
+# the block name and its (start, stop) slice instead of a pickled DataFrame.
+#
+# Segments smaller than MIN_SEGMENT_SIZE cannot support the quartiles and
+# clusters a fit needs, so they are pooled into one 'other' segment; if the
+# pool is still too small those employees are left out.
+# Scores used for the comparison take cluster_risk out-of-fold, so neither
+# side is rewarded for memorizing the fraud labels it is evaluated on.
+
+def attach_block(name, shape):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype='float64', buffer=block.buf)
+
+
+def fit_segment(task):
+    """Fit and score one segment from its slice of the shared feature block."""
+    name, shape, start, stop, n_clusters = task
+    block, data = attach_block(name, shape)
+    try:
+        rows = data[start:stop]
+        segment = pd.DataFrame(rows[:, :-1], columns=DETECTION_COLS)
+        segment['is_fraud'] = rows[:, -1]
+        segment['employee_id'] = np.arange(start, stop)
+        bundle = fit_models(segment, n_clusters=min(n_clusters, len(segment)))
+        scored = score_features(bundle, segment, out_of_fold=True)
+    finally:
+        block.close()
+    return start, stop, scored.drop(columns='employee_id')
+
+
+def segment_labels(features, by, min_size=MIN_SEGMENT_SIZE):
+    """Segment of every employee, with segments below min_size pooled into 'other' (NaN if still too small)."""
+    labels = features[by].astype(str)
+    sizes = labels.map(labels.value_counts())
+    labels = labels.where(sizes >= min_size, 'other')
+    if (labels == 'other').sum() < min_size:
+        labels = labels.where(labels != 'other')
+    return labels
+
+
+def fit_segmented(features, by='department', workers=None, n_clusters=4, min_size=MIN_SEGMENT_SIZE):
+    """Per-segment composite scores merged back into one frame, plus timings."""
+    from concurrent.futures import ProcessPoolExecutor
+
+    features = features.assign(segment=segment_labels(features, by, min_size)).dropna(subset=['segment'])
+    ordered = features.sort_values('segment', kind='stable', ignore_index=True)
+    data = np.column_stack([ordered[DETECTION_COLS].to_numpy(dtype='float64'),
+                            ordered['is_fraud'].to_numpy(dtype='float64')])
+
+    codes = pd.factorize(ordered['segment'])[0]
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = np.concatenate([[0], bounds])
+    stops = np.concatenate([bounds, [len(ordered)]])
+
+    start_time = time.perf_counter()
+    block = shared_memory.SharedMemory(create=True, size=data.nbytes)
+    try:
+        np.ndarray(data.shape, dtype='float64', buffer=block.buf)[:] = data
+        tasks = [(block.name, data.shape, int(a), int(b), n_clusters) for a, b in zip(starts, stops)]
+        workers = workers or os.cpu_count()
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                results = list(pool.map(fit_segment, tasks))
+        else:
+            results = [fit_segment(task) for task in tasks]
+    finally:
+        block.close()
+        block.unlink()
+
+    scored = pd.concat([r[2].set_index(pd.RangeIndex(r[0], r[1])) for r in results]).sort_index()
+    columns = list(dict.fromkeys(['employee_id', by, 'segment', 'is_fraud', 'fraud_type']))
+    merged = pd.concat([ordered[columns], scored], axis=1)
+    # clusters are only comparable inside a segment
+    merged['segment_cluster'] = merged['segment'] + ':' + merged['cluster'].astype(str)
+    return merged, time.perf_counter() - start_time
+
+
+def fit_global(features):
+    start = time.perf_counter()
+    scored = score_features(fit_models(features), features, out_of_fold=True)
+    scored['is_fraud'] = features['is_fraud'].to_numpy()
+    return scored, time.perf_counter() - start
+
+
+# =============================================================================
+# COMPARISON
+# =============================================================================
+
+def precision_at_k(scored, k):
+    return float(scored.nlargest(k, 'risk_score')['is_fraud'].astype(bool).mean())
+
+
+def compare_models(global_scores, segmented_scores):
+    # employees left out of the segments are left out of both sides
+    global_scores = global_scores[global_scores['employee_id'].isin(segmented_scores['employee_id'])]
+    k = int(global_scores['is_fraud'].astype(bool).sum())
+    joined = global_scores.set_index('employee_id')[['risk_score']].join(
+        segmented_scores.set_index('employee_id')[['risk_score']], rsuffix='_segmented')
+    top_global = set(global_scores.nlargest(k, 'risk_score')['employee_id'])
+    top_segmented = set(segmented_scores.nlargest(k, 'risk_score')['employee_id'])
+    return {
+        'k': k,
+        'precision_at_k_global': precision_at_k(global_scores, k),
+        'precision_at_k_segmented': precision_at_k(segmented_scores, k),
+        'top_k_overlap': len(top_global & top_segmented) / max(k, 1),
+        'spearman': float(joined['risk_score'].corr(joined['risk_score_segmented'], method='spearman')),
+    }
+
+
+def synthetic_features(num_employees):
+    """Employee features for a generated population (vectorized generator)."""
+    import timeSheetFraudLab as lab
+
+    records = lab.build_dataset_vectorized(lab.create_employees(num_employees))
+    records, _ = lab.add_statistical_columns(records)
+    return build_employee_features(records)
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-segment anomaly models fitted in parallel.')
+    parser.add_argument('--csv', default=default_records_path())
+    parser.add_argument('--employees', type=int, help='Generate a synthetic population of this size instead')
+    parser.add_argument('--by', default='department', help='Grouping column for the segments')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--min-size', type=int, default=MIN_SEGMENT_SIZE,
+                        help="Pool segments with fewer employees into 'other'")
+    args = parser.parse_args()
+
+    if args.employees:
+        features = synthetic_features(args.employees)
+    else:
+        features = TimesheetPipeline(args.csv).run('features')
+
+    segmented, seg_seconds = fit_segmented(features, args.by, args.workers, args.clusters, args.min_size)
+    global_scores, global_seconds = fit_global(features)
+    comparison = compare_models(global_scores, segmented)
+
+    print("=" * 70)
+    print(f"SEGMENTED MODELS BY {args.by.upper()} ({segmented['segment'].nunique()} segments, "
+          f"{args.workers} workers)")
+    print("=" * 70)
+    if len(segmented) < len(features):
+        print(f"[!] {len(features) - len(segmented)} employees in segments below {args.min_size} left out")
+    print(f"Global fit:    {global_seconds:.2f}s")
+    print(f"Segmented fit: {seg_seconds:.2f}s")
+    print(f"Precision@{comparison['k']}: global {comparison['precision_at_k_global']:.2f}, "
+          f"segmented {comparison['precision_at_k_segmented']:.2f}")
+    print(f"Top-{comparison['k']} overlap: {comparison['top_k_overlap']:.2f}, "
+          f"Spearman rank correlation: {comparison['spearman']:.2f}")
+    print("\nTop 15 (segmented risk_score):")
+    print(segmented.nlargest(15, 'risk_score')[
+        ['employee_id', args.by, 'risk_score', 'iqr_flags', 'iso_score', 'segment_cluster', 'is_fraud', 'fraud_type']
+    ].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import time
+import argparse
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from timesheetAnalysis import TimesheetPipeline, default_records_path
+from timesheetModels import DETECTION_COLS, iqr_flags, out_of_fold_cluster_risk
+
+CONTAMINATION_GRID = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3]
+CLUSTER_GRID = [2, 3, 4, 5, 6, 8]
+WEIGHT_STEPS = [0.0, 0.15, 0.25, 0.35, 0.45, 0.55]
+RISK_THRESHOLD = 0.5
+
+
+# =============================================================================
+# SWEEP
+# =============================================================================
+# The features are scaled once and the IsolationForest is fitted once:
+# contamination only moves the forest's decision threshold (score_samples
+# does not depend on it) and the composite score normalizes iso_score by its
+# range, so every contamination value is a percentile cut of the same scores.
+# KMeans is the only refit, once per n_clusters, in parallel through joblib;
+# each job then scores every weight vector at once as a matrix product.
+#
+# Contamination never reaches risk_score, so it is reported in its own table
+# (iso_suspect precision/recall) instead of being crossed with the composite
+# grid. Weight vectors are rescaled to sum to 1, which keeps every composite
+# score in [0, 1] and makes the fixed RISK_THRESHOLD mean the same thing for
+# all of them. cluster_risk is the cluster fraud rate measured on the other
+# folds, so a configuration cannot win by memorizing the labels it is scored on.
+
+def precision_recall(flagged, truth):
+    hits = (flagged & truth[:, None]).sum(axis=0)
+    n_flagged = flagged.sum(axis=0)
+    precision = np.divide(hits, n_flagged, out=np.zeros(len(hits)), where=n_flagged > 0)
+    recall = hits / max(truth.sum(), 1)
+    return precision, recall
+
+
+def normalize_weights(weights):
+    weights = np.atleast_2d(np.asarray(weights, dtype='float64'))
+    return weights / weights.sum(axis=1, keepdims=True)
+
+
+def weight_grid(steps=WEIGHT_STEPS):
+    """Distinct (iqr, iso, cluster) weight vectors summing to 1, from every non-zero combination of steps."""
+    grid = normalize_weights([w for w in itertools.product(steps, repeat=3) if sum(w) > 0])
+    # proportional combinations collapse to the same vector once normalized
+    return np.unique(grid.round(12), axis=0)
+
+
+def evaluate_clusters(X_scaled, components, truth, n_clusters, weights, random_state=42):
+    """Fit KMeans for one n_clusters and score every weight vector against the ground truth."""
+    from sklearn.cluster import KMeans
+
+    start = time.perf_counter()
+    labels = KMeans(n_clusters=n_clusters, random_state=random_state, n_init=10).fit_predict(X_scaled)
+    fit_seconds = time.perf_counter() - start
+
+    cluster_risk = out_of_fold_cluster_risk(labels, truth, random_state=random_state)
+    scores = np.column_stack([components, cluster_risk]) @ weights.T
+
+    precision, recall = precision_recall(scores >= RISK_THRESHOLD, truth)
+    k = int(truth.sum())
+    top_k = np.argsort(-scores, axis=0)[:k]
+    precision_at_k = truth[top_k].mean(axis=0)
+
+    return pd.DataFrame({
+        'n_clusters': n_clusters,
+        'w_iqr': weights[:, 0],
+        'w_iso': weights[:, 1],
+        'w_cluster': weights[:, 2],
+        'precision': precision,
+        'recall': recall,
+        'precision_at_k': precision_at_k,
+        'kmeans_seconds': fit_seconds,
+        'eval_seconds': (time.perf_counter() - start - fit_seconds) / len(weights),
+    })
+
+
+def run_sweep(features, contamination_grid=CONTAMINATION_GRID, cluster_grid=CLUSTER_GRID,
+              weights=None, n_jobs=-1, random_state=42):
+    from joblib import Parallel, delayed
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+
+    weights = weight_grid() if weights is None else normalize_weights(weights)
+    truth = features['is_fraud'].to_numpy(dtype=bool)
+    X = features[DETECTION_COLS].to_numpy(dtype='float64')
+    timings = {}
+
+    start = time.perf_counter()
+    X_scaled = StandardScaler().fit_transform(X)
+    forest = IsolationForest(random_state=random_state).fit(X_scaled)
+    iso_raw = forest.score_samples(X_scaled)
+    timings['forest'] = time.perf_counter() - start
+
+    # Same normalizations as build_composite_score
+    flags = iqr_flags({'iqr': dict(zip(['q1', 'median', 'q3'],
+                                       np.quantile(X, [0.25, 0.5, 0.75], axis=0)))}, X)
+    iqr_score = flags / flags.max() if flags.max() else np.zeros(len(X))
+    iso_norm = 1 - (iso_raw - iso_raw.min()) / (iso_raw.max() - iso_raw.min())
+    components = np.column_stack([iqr_score, iso_norm])
+
+    # One forest, one percentile cut per contamination value
+    start = time.perf_counter()
+    cuts = np.quantile(iso_raw, contamination_grid)
+    iso_precision, iso_recall = precision_recall(iso_raw[:, None] < cuts[None, :], truth)
+    contamination = pd.DataFrame({
+        'contamination': contamination_grid,
+        'iso_precision': iso_precision,
+        'iso_recall': iso_recall,
+        'iso_eval_seconds': (time.perf_counter() - start) / len(contamination_grid),
+    })
+
+    start = time.perf_counter()
+    composite = pd.concat(Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_clusters)(X_scaled, components, truth, k, weights, random_state)
+        for k in cluster_grid
+    ), ignore_index=True)
+    timings['clusters'] = time.perf_counter() - start
+
+    composite['f1'] = np.where(composite['precision'] + composite['recall'] > 0,
+                               2 * composite['precision'] * composite['recall']
+                               / (composite['precision'] + composite['recall']).replace(0, 1), 0.0)
+    timings['configurations'] = len(contamination) + len(composite)
+    composite = composite.sort_values(['f1', 'precision_at_k'], ascending=False, ignore_index=True)
+    return contamination, composite, timings
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep contamination, n_clusters and composite weights.')
+    parser.add_argument('--csv', default=default_records_path())
+    parser.add_argument('--jobs', type=int, default=-1)
+    parser.add_argument('--out', help='Write the full composite table to this CSV')
+    args = parser.parse_args()
+
+    features = TimesheetPipeline(args.csv).run('features')
+    start = time.perf_counter()
+    contamination, composite, timings = run_sweep(features, n_jobs=args.jobs)
+    total = time.perf_counter() - start
+
+    print("=" * 70)
+    print("HYPERPARAMETER SWEEP")
+    print("=" * 70)
+    print(f"{timings['configurations']} configurations in {total:.2f}s "
+          f"(forest {timings['forest']:.2f}s, KMeans grid {timings['clusters']:.2f}s)")
+
+    print("\nIsolationForest contamination (iso_suspect):")
+    print(contamination[['contamination', 'iso_precision', 'iso_recall']].round(3).to_string(index=False))
+
+    # the analysis weights (0.35, 0.45, 0.25) rescaled to sum to 1
+    default = normalize_weights([0.35, 0.45, 0.25])[0]
+    current = composite[(composite['n_clusters'] == 4) & np.isclose(composite['w_iqr'], default[0])
+                        & np.isclose(composite['w_iso'], default[1]) & np.isclose(composite['w_cluster'], default[2])]
+    cols = ['n_clusters', 'w_iqr', 'w_iso', 'w_cluster', 'precision', 'recall', 'f1', 'precision_at_k']
+    print(f"\nComposite risk_score >= {RISK_THRESHOLD}, current defaults:")
+    print(current[cols].round(3).to_string(index=False))
+    print("\nTop 10:")
+    print(composite[cols].head(10).round(3).to_string(index=False))
+
+    if args.out:
+        composite.to_csv(args.out, index=False)
+        print(f"\nSaved: {args.out}")
+
+
+if __name__ == "__main__":
+    main()